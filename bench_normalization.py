@@ -0,0 +1,109 @@
+import re
+import time
+import random
+import argparse
+import unicodedata
+from string import whitespace
+
+from normalization import make_string_standard, make_strings_standard
+from chat_export import iterate_contents
+
+# Reference implementation, as it was in script_MS.py
+diacr_letters = "žčšěйćżęų"
+plain_letters = "жчшєjчжеу"
+
+lat_alphabet = "abcčdeěfghijjklmnoprsštuvyzž"
+cyr_alphabet = "абцчдеєфгхийьклмнопрсштувызж"
+
+save_diacrits = str.maketrans(diacr_letters, plain_letters)
+cyr2lat = str.maketrans(cyr_alphabet, lat_alphabet)
+
+
+def reference_make_string_standard(thestring):
+    thestring = unicodedata.normalize(
+        'NFKC',
+        thestring
+    ).lower().replace("\n", " ")
+
+    thestring = unicodedata.normalize(
+        'NFKD',
+        thestring.translate(save_diacrits)
+    )
+    filtered = "".join(c for c in thestring if c in whitespace or c.isalpha())
+    filtered = filtered.replace(
+        "đ", "dž").replace(
+        "љ", "ль").replace("њ", "нь").replace(
+        "я", "йа").replace("ю", "йу").replace("ё", "йо")
+
+    filtered = filtered.translate(cyr2lat)
+
+    return re.sub(r'j+', r'j', filtered)
+
+
+SAMPLE_MESSAGES = [
+    "ољењ трамвай чей шар свояченица любит свою яйцекладку.",
+    "Poględnųti jak to prěkladaje kirilicų v latinicų",
+    "Zdravo vsim! Kako se imate?",
+    "Dobry denj, ja jesm nov tut :)",
+    "Њиве и љиљани, đak i ђак",
+    "ok thanks, see you tomorrow",
+    "Ĺ Ŕ ǉ ǌ ǆ ﬁ ½ ² ê ž̌̌",
+    "Mnogo\nlinij\nv\njednoj\nporuke jjj JJJ",
+]
+
+
+def synthetic_messages(count, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(SAMPLE_MESSAGES) for _ in range(count)]
+
+
+def read_messages(fname):
+    if fname.endswith(".json"):
+        return list(iterate_contents(fname))
+    with open(fname, "r", encoding="utf8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def measure(func, messages, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(messages)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Compare make_string_standard implementations')
+    parser.add_argument(
+        'messages', nargs='?', default=None,
+        help='chat export (.json) or text file with one message per line '
+             '(synthetic if omitted)')
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.messages:
+        messages = read_messages(args.messages)
+    else:
+        messages = synthetic_messages(args.count)
+
+    mismatches = 0
+    for message in messages:
+        expected = reference_make_string_standard(message)
+        if make_string_standard(message) != expected:
+            mismatches += 1
+            if mismatches <= 10:
+                print("MISMATCH", repr(message), repr(expected),
+                      repr(make_string_standard(message)))
+
+    old = measure(
+        lambda msgs: [reference_make_string_standard(m) for m in msgs],
+        messages, args.repeat)
+    new = measure(make_strings_standard, messages, args.repeat)
+
+    print(f"messages: {len(messages)}, mismatches: {mismatches}")
+    print(f"reference: {len(messages) / old:.0f} msg/s")
+    print(f"normalization: {len(messages) / new:.0f} msg/s ({old / new:.1f}x)")
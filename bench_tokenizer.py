@@ -0,0 +1,107 @@
+import sys
+import time
+import random
+import argparse
+
+from constants import BASE_ISV_TOKEN_REGEX
+from tokenizer import WORD, tokenize, tokenize_many, words
+from bench_toolchain import DEFAULT_CORPUS, read_corpus
+
+
+def reference_tokenize(paragraph):
+    # the loop from example2.spellcheck_text / example4.iterate_over_text
+    tokens = []
+    for delim in BASE_ISV_TOKEN_REGEX.finditer(paragraph):
+        is_word = any(c.isalpha() for c in delim.group())
+        tokens.append((delim.start(), delim.end(), is_word))
+    return tokens
+
+
+def as_reference(tokens):
+    return [(start, end, kind == WORD) for start, end, kind in tokens]
+
+
+FUZZ_ALPHABET = (
+    "aAbzZčČěĚšžåųćęđŕľńȯìüßſKİı" "абвяЯёЁјљєњЈЉ" "0123456789²½Ⅻ٣"
+    "-_.,!?:;()[]\"'«»„“”@#/ \t\n"
+)
+
+
+def fuzz_texts(count, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 40)))
+            for _ in range(count)]
+
+
+def check(texts):
+    mismatches = 0
+    for text in texts:
+        expected = reference_tokenize(text)
+        found = as_reference(tokenize(text))
+        found_words = words(text)
+        expected_words = [text[start:end] for start, end, is_word in expected if is_word]
+        if found != expected or found_words != expected_words:
+            mismatches += 1
+            if mismatches <= 10:
+                print("MISMATCH", repr(text), expected, found)
+    return mismatches
+
+
+def check_all_chars():
+    """
+    Every single code point (alone and after a letter, a digit and a dot)
+    is tokenized the same way
+    """
+    mismatches = 0
+    for c in map(chr, range(sys.maxunicode + 1)):
+        for text in (c, "a" + c, "1" + c, "." + c):
+            if as_reference(tokenize(text)) != reference_tokenize(text):
+                mismatches += 1
+                if mismatches <= 10:
+                    print("MISMATCH", repr(text))
+    return mismatches
+
+
+def measure(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Check tokenizer against BASE_ISV_TOKEN_REGEX and compare speed')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--fuzz', type=int, default=100000)
+    parser.add_argument(
+        '--all-chars', action='store_true',
+        help='also check every code point (takes a few minutes)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    paragraphs = read_corpus(args.corpus)
+
+    fuzz = fuzz_texts(args.fuzz)
+    mismatches = check(paragraphs) + check(fuzz)
+    expected = [tokenize(text) for text in fuzz]
+    if tokenize_many(fuzz) != expected:
+        mismatches += 1
+        print("MISMATCH tokenize_many")
+    if args.all_chars:
+        mismatches += check_all_chars()
+
+    n_tokens = sum(len(tokenize(p)) for p in paragraphs)
+    old = measure(lambda: [reference_tokenize(p) for p in paragraphs], args.repeat)
+    new = measure(lambda: [tokenize(p) for p in paragraphs], args.repeat)
+    batch = measure(lambda: tokenize_many(paragraphs), args.repeat)
+
+    print(f"paragraphs: {len(paragraphs)}, tokens: {n_tokens}, mismatches: {mismatches}")
+    print(f"reference: {n_tokens / old:.0f} tokens/s")
+    print(f"tokenize: {n_tokens / new:.0f} tokens/s ({old / new:.1f}x)")
+    print(f"tokenize_many: {n_tokens / batch:.0f} tokens/s ({old / batch:.1f}x)")
+    if mismatches:
+        sys.exit(1)
@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from os.path import join, dirname, abspath, getsize, isfile
+
+from convert import Dictionary, lat2cyr, lat2std, lat2etm
+from diacritics import DiacriticRestorer, build_restoration_index
+from ngram_model import NgramModel, build_count_table, count_ngrams
+from lemma_index import iterate_form_lemma_pairs
+from suggestions import FLAT_TRANS, SuggestionIndex, build_suggestion_index
+from synthetic_words_forms import write_words_forms
+
+BENCH_DIR = join(dirname(abspath(__file__)), "benchmarks")
+DEFAULT_WORDS_FORMS = join(BENCH_DIR, "words_forms_sample.txt")
+DEFAULT_CORPUS = join(BENCH_DIR, "corpus.txt")
+LANGS = ['isv_cyr', 'isv_lat', 'isv_etm']
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=dirname(abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchmarkSuite(object):
+    """
+    Runs named benchmarks, keeps best and median of `repeat` runs.
+    Names are dotted ("export_to_xml.isv_lat"), `only` selects by substring.
+    """
+    def __init__(self, repeat=3, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+        self.skipped = {}
+
+    def selected(self, name):
+        return not self.only or any(part in name for part in self.only)
+
+    def run(self, name, func, items=None):
+        if not self.selected(name):
+            return
+        timings = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        entry = {"best": best, "median": statistics.median(timings),
+                 "repeat": self.repeat}
+        message = f"{name:32} {best * 1000:10.2f} ms"
+        if items:
+            entry["items"] = items
+            entry["per_sec"] = items / best
+            message += f" {items / best:14.0f} items/s"
+        self.results[name] = entry
+        print(message)
+
+    def skip(self, name, reason):
+        if self.selected(name):
+            self.skipped[name] = reason
+            print(f"{name:32} skipped: {reason}")
+
+    def summary(self):
+        """
+        Table of all benchmarks, skipped ones included with the reason
+        """
+        print(f"{'benchmark':32} {'best':>13} {'items/s':>14}")
+        for name in sorted(set(self.results) | set(self.skipped)):
+            if name in self.results:
+                entry = self.results[name]
+                per_sec = f"{entry['per_sec']:14.0f}" if "per_sec" in entry else ""
+                print(f"{name:32} {entry['best'] * 1000:10.2f} ms {per_sec}")
+            else:
+                print(f"{name:32} {'SKIPPED':>13}  {self.skipped[name]}")
+
+
+def read_corpus(fname):
+    with open(fname, "r", encoding="utf8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def bench_dictionary(suite, words_forms, mapping):
+    d = Dictionary(words_forms, mapping)
+    n_lemmas = len(d.lemmas)
+    suite.run("dictionary.load", lambda: Dictionary(words_forms, mapping), n_lemmas)
+    suite.run("dictionary.load_lazy",
+              lambda: Dictionary(words_forms, mapping, lazy=True), n_lemmas)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        for lang in LANGS:
+            fname = join(out_dir, f"out_{lang}.xml")
+            suite.run(f"export_to_xml.{lang}",
+                      lambda: d.export_to_xml(fname, lang=lang), n_lemmas)
+
+    forms = [form.form.lower() for lemma in d.lemmas.values()
+             for same_tags in lemma.forms.values() for form in same_tags]
+    for func in [lat2cyr, lat2std, lat2etm]:
+        suite.run(f"translit.{func.__name__}",
+                  lambda: [func(form) for form in forms], len(forms))
+
+
+def bench_suggestions(suite, words_forms, mapping, words):
+    # the lookups need the index built first
+    if not any(map(suite.selected, ["suggestions.build", "suggestions.suggest"])):
+        return
+    d = Dictionary(words_forms, mapping, lazy=True)
+    pairs = list(iterate_form_lemma_pairs(d))
+    with tempfile.TemporaryDirectory() as out_dir:
+        fname = join(out_dir, "suggestions.bin")
+        suite.run("suggestions.build",
+                  lambda: build_suggestion_index(pairs, fname), len(pairs))
+        if not isfile(fname):
+            build_suggestion_index(pairs, fname)
+        index = SuggestionIndex(fname)
+        # uncached lookups, as for every new unknown word
+        distinct = list(dict.fromkeys(words))[:2000]
+        suite.run("suggestions.suggest",
+                  lambda: [index._suggest(word, 5) for word in distinct], len(distinct))
+        index.close()
+
+
+def bench_restoration(suite, words_forms, mapping, lines):
+    names = ["restoration.build", "restoration.restore_text", "restoration.disambiguate"]
+    if not any(map(suite.selected, names)):
+        return
+    d = Dictionary(words_forms, mapping, lazy=True)
+    pairs = list(iterate_form_lemma_pairs(d, lang="isv_etm"))
+    # corpus with every diacritic stripped, as typed on a plain keyboard
+    plain_lines = [lat2std(line).translate(FLAT_TRANS) for line in lines]
+    n_tokens = sum(len(line.split()) for line in plain_lines)
+    with tempfile.TemporaryDirectory() as out_dir:
+        fname = join(out_dir, "restore.bin")
+        suite.run("restoration.build",
+                  lambda: build_restoration_index(pairs, fname), len(pairs))
+        if not isfile(fname):
+            build_restoration_index(pairs, fname)
+        restorer = DiacriticRestorer(fname)
+        suite.run("restoration.restore_text",
+                  lambda: [restorer.restore_text(line) for line in plain_lines],
+                  n_tokens)
+
+        model_fname = join(out_dir, "ngram.bin")
+        build_count_table(count_ngrams(lines), model_fname)
+        model = NgramModel(model_fname)
+        suite.run("restoration.disambiguate",
+                  lambda: [restorer.disambiguate(line, model) for line in plain_lines],
+                  n_tokens)
+        model.close()
+        restorer.close()
+
+
+def bench_letter_change(suite, words):
+    try:
+        import example1
+    except ImportError as e:
+        suite.skip("letter_change", str(e))
+        return
+    for func in [example1.srb_letter_change, example1.pol_letter_change,
+                 example1.cz_letter_change, example1.rus_letter_change]:
+        suite.run(f"letter_change.{func.__name__.split('_')[0]}",
+                  lambda: [func(word) for word in words], len(words))
+
+
+FLAVORS = ["ru", "pl", "cs", "sr"]
+MORPHOLOGY_BENCHMARKS = ["spellcheck_text"] + [f"flavorise.{lang}" for lang in FLAVORS]
+
+
+def skip_morphology(suite, reason):
+    for name in MORPHOLOGY_BENCHMARKS:
+        suite.skip(name, reason)
+
+
+def bench_morphology(suite, dicts_path, lines, words):
+    """
+    spellcheck_text and flavorise need pymorphy2 dictionaries built by
+    run_generate.py (out_isv_lat and out_isv_etm in dicts_path)
+    """
+    try:
+        import pymorphy2
+        from constants import DEFAULT_UNITS, SIMPLE_DIACR_SUBS
+        import example1
+        from example2 import spellcheck_text
+    except ImportError as e:
+        skip_morphology(suite, str(e))
+        return
+
+    std_morph = pymorphy2.MorphAnalyzer(
+        join(dicts_path, "out_isv_lat"),
+        units=DEFAULT_UNITS,
+        char_substitutes=SIMPLE_DIACR_SUBS
+    )
+    std_lines = [lat2std(line) for line in lines]
+    n_tokens = sum(len(line.split()) for line in std_lines)
+    suite.run("spellcheck_text",
+              lambda: [list(spellcheck_text(line, std_morph)) for line in std_lines],
+              n_tokens)
+
+    isv_morph = pymorphy2.MorphAnalyzer(
+        join(dicts_path, "out_isv_etm"), units=DEFAULT_UNITS)
+    tagged = []
+    for word in words:
+        parsed = isv_morph.parse(word)
+        if parsed and parsed[0].tag.POS:
+            tagged.append((word, str(parsed[0].tag.POS)))
+    flavors = {"ru": (example1.RU_FLAVOR, True), "pl": (example1.PL_FLAVOR, True),
+               "cs": (example1.CS_FLAVOR, False), "sr": (example1.SR_FLAVOR, False)}
+    for lang, (flavor, ju) in flavors.items():
+        suite.run(f"flavorise.{lang}",
+                  lambda: [example1.flavorise(word, pos, isv_morph, flavor, ju)
+                           for word, pos in tagged],
+                  len(tagged))
+
+
+def compare(results, baseline, threshold, skipped=None):
+    """
+    Prints per-benchmark ratio against baseline results (and the
+    baseline benchmarks that were skipped this time);
+    returns names that got slower by more than threshold
+    """
+    regressions = []
+    for name in sorted(set(baseline["results"]) - set(results)):
+        reason = (skipped or {}).get(name, "not run")
+        print(f"{name:32} {'SKIPPED':>7}  {reason}")
+    for name, entry in sorted(results.items()):
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        ratio = entry["best"] / old["best"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:32} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmarks for the morphology toolchain')
+    parser.add_argument('--words-forms', default=DEFAULT_WORDS_FORMS)
+    parser.add_argument(
+        '--synthetic', type=int, default=None, metavar='LEMMAS',
+        help='generate words_forms of this size instead of the bundled sample')
+    parser.add_argument('--mapping', default=None)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument(
+        '--dicts', default=None,
+        help='directory with out_isv_lat and out_isv_etm pymorphy2 '
+             'dictionaries; spellcheck and flavorise are skipped without it')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--only', nargs='*', default=None,
+        help='run only benchmarks which names contain one of these')
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument(
+        '--compare', default=None,
+        help='results of a previous run; exit code 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    suite = BenchmarkSuite(repeat=args.repeat, only=args.only)
+    lines = read_corpus(args.corpus)
+    words = [word.strip(".,?!:;()«»\"'").lower()
+             for line in lines for word in line.split()]
+    words = [word for word in words if word]
+
+    synthetic_dir = None
+    if args.synthetic:
+        synthetic_dir = tempfile.TemporaryDirectory()
+        args.words_forms = join(synthetic_dir.name, f"words_forms_{args.synthetic}.txt")
+        write_words_forms(args.words_forms, args.synthetic)
+
+    bench_dictionary(suite, args.words_forms, args.mapping)
+    bench_suggestions(suite, args.words_forms, args.mapping, words)
+    bench_restoration(suite, args.words_forms, args.mapping, lines)
+    bench_letter_change(suite, words)
+    if args.dicts:
+        bench_morphology(suite, args.dicts, lines, words)
+    else:
+        skip_morphology(suite, "no --dicts given")
+    print()
+    suite.summary()
+
+    data = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "words_forms": os.path.basename(args.words_forms),
+            "words_forms_bytes": getsize(args.words_forms),
+            "corpus": os.path.basename(args.corpus),
+            "corpus_lines": len(lines),
+            "repeat": args.repeat,
+        },
+        "results": suite.results,
+        "skipped": suite.skipped,
+    }
+    if synthetic_dir is not None:
+        synthetic_dir.cleanup()
+    with open(args.out, "w", encoding="utf8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"-> {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf8") as f:
+            baseline = json.load(f)
+        if compare(suite.results, baseline, args.threshold, suite.skipped):
+            sys.exit(1)
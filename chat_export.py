@@ -0,0 +1,136 @@
+import json
+import argparse
+
+from compressed_io import open_compressed
+
+CHUNK_SIZE = 1 << 20
+WHITESPACE = " \t\n\r"
+
+
+class IncrementalJSONReader(object):
+    """
+    Minimal pull parser over a text stream.
+    Containers we are interested in are walked token by token, everything
+    else is decoded with the C-accelerated json decoder, one value at a time,
+    so memory use is bounded by the largest single value (one message).
+    """
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                break
+            self._fill()
+        return self.buf[self.pos] if self.pos < len(self.buf) else ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(
+                "expected %r, got %r at %d" % (char, found, self.pos))
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # a number cut by the chunk boundary still decodes, so a value
+            # ending exactly at the end of buffer has to be read again
+            if end == len(self.buf) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return obj
+
+    def iterate_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("]")
+                return
+
+    def iterate_object(self):
+        """
+        Yields keys of the current object; caller must consume the value
+        (with value() or iterate_array()) before asking for the next key
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return
+
+
+def iterate_messages(fname_or_fp):
+    """
+    Lazily yields message records of Discord chat export (DiscordChatExporter
+    JSON format). A bare top-level array of messages is accepted as well,
+    so are compressed (.gz/.bz2/.zst) exports.
+    """
+    if isinstance(fname_or_fp, str):
+        with open_compressed(fname_or_fp, "rt") as fp:
+            yield from iterate_messages(fp)
+        return
+
+    reader = IncrementalJSONReader(fname_or_fp)
+    if reader.peek() == "[":
+        yield from reader.iterate_array()
+        return
+
+    for key in reader.iterate_object():
+        if key == "messages":
+            yield from reader.iterate_array()
+        else:
+            reader.value()
+
+
+def iterate_contents(fname_or_fp):
+    for message in iterate_messages(fname_or_fp):
+        content = message.get("content")
+        if content:
+            yield content
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Dump contents of Discord chat export, one per line')
+    parser.add_argument('export')
+    args = parser.parse_args()
+
+    for content in iterate_contents(args.export):
+        print(content.replace("\n", " "))
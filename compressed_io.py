@@ -0,0 +1,142 @@
+import io
+import bz2
+import gzip
+import queue
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# writes are grouped into chunks of this size before they are handed
+# to the compressing thread
+CHUNK_SIZE = 1 << 20
+
+
+def compression_of(fname):
+    """
+    Compression by file extension: "gz", "bz2", "zst" or None
+    """
+    lowered = fname.lower()
+    if lowered.endswith(".gz"):
+        return "gz"
+    if lowered.endswith(".bz2"):
+        return "bz2"
+    if lowered.endswith((".zst", ".zstd")):
+        return "zst"
+    return None
+
+
+def open_compressed(fname, mode="rt", encoding="utf8", level=None):
+    """
+    Drop-in replacement for open(): .gz, .bz2 and .zst/.zstd files are
+    (de)compressed transparently, anything else is opened as is.
+    zstd needs the optional zstandard package.
+    """
+    compression = compression_of(fname)
+    text = "b" not in mode
+    kwargs = {"encoding": encoding} if text else {}
+
+    if compression == "gz":
+        return gzip.open(fname, mode, compresslevel=level or 6, **kwargs)
+    if compression == "bz2":
+        return bz2.open(fname, mode, compresslevel=level or 9, **kwargs)
+    if compression == "zst":
+        if zstandard is None:
+            raise ImportError(
+                "zstandard package is required to open %s" % fname)
+        if "r" in mode:
+            params = {}
+        else:
+            params = {"cctx": zstandard.ZstdCompressor(level=level or 3)}
+        fp = zstandard.open(fname, mode.replace("t", "").replace("b", "") + "b",
+                            **params)
+        return io.TextIOWrapper(fp, encoding=encoding) if text else fp
+    return open(fname, mode, **kwargs)
+
+
+class BackgroundWriter(object):
+    """
+    Write-only file object that hands data over to a thread, which does
+    the actual (compressing) write. zlib, bz2 and zstd release the GIL
+    while compressing, so compression overlaps with producing the output.
+    """
+    def __init__(self, fp, chunk_size=CHUNK_SIZE, max_chunks=8):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.closed = False
+        self._buf = []
+        self._buffered = 0
+        self._error = None
+        self._queue = queue.Queue(max_chunks)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            if self._error is None:
+                try:
+                    self.fp.write(chunk)
+                except Exception as e:
+                    # reported to the producer on its next write/close
+                    self._error = e
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def _flush_buf(self):
+        if self._buf:
+            self._queue.put(b"".join(self._buf))
+            self._buf = []
+            self._buffered = 0
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._check()
+        self._buf.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.chunk_size:
+            self._flush_buf()
+        return len(data)
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._flush_buf()
+        self._queue.put(None)
+        self._thread.join()
+        self.fp.close()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_output(fname, level=None, threaded=True):
+    """
+    Opens fname for binary writing; compressed outputs are compressed
+    in a background thread unless threaded is False
+    """
+    fp = open_compressed(fname, "wb", level=level)
+    if compression_of(fname) is None or not threaded:
+        return fp
+    return BackgroundWriter(fp)
@@ -1,19 +1,20 @@
 from __future__ import unicode_literals
 import re
 import sys
-import gzip
 import os.path
-import bz2file as bz2
 import codecs
 import logging
 import ujson
+from collections import Counter, defaultdict
 
 import xml.etree.cElementTree as ET
 
-from unicodecsv import DictReader
+from csv import DictReader
 import unicodedata
 from string import whitespace
 
+from compressed_io import open_compressed, open_output
+
 # To add stats collection in inobstrusive way (that can be simply disabled)
 from blinker import signal
 
@@ -88,6 +89,16 @@ translation_functions = {
     "isv_etm": lat2etm,
 }
 
+
+class ParadigmError(ValueError):
+    """
+    Raised when words_forms entry cannot be turned into a paradigm;
+    kind is used to group such errors in LoadReport
+    """
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
 def infer_pos(arr):
     if 'adj' in arr:
         return 'adjective'
@@ -132,24 +143,30 @@ class TagSet(object):
     Class that represents LanguageTool tagset
     Can export it to OpenCorpora XML
     Provides some shorthands to simplify checks/conversions
+
+    Read-only after construction (groups are tuples, ranks are precomputed)
+    and picklable; use TagSet.load to get one shared copy per process
     """
+    _loaded = {}
+
     def __init__(self, fname):
         self.all = []
         self.full = {}
         self.groups = []
         self.lt2opencorpora = {}
+        group_members = {}
 
-        with open(fname, 'rb') as fp:
-            r = DictReader(fp,delimiter=';')
+        with open(fname, 'r', encoding='utf8', newline='') as fp:
+            r = DictReader(fp, delimiter=';')
 
             for tag in r:
                 # lemma form column represents set of tags that wordform should
                 # have to be threatened as lemma.
-                tag["lemma form"] = filter(None, [s.strip() for s in
-                                           tag["lemma form"].split(",")])
+                tag["lemma form"] = tuple(filter(None, [s.strip() for s in
+                                          tag["lemma form"].split(",")]))
 
-                tag["divide by"] = filter(
-                    None, [s.strip() for s in tag["divide by"].split(",")])
+                tag["divide by"] = tuple(filter(
+                    None, [s.strip() for s in tag["divide by"].split(",")]))
 
                 # opencopropra tags column maps LT tags to OpenCorpora tags
                 # when possible
@@ -162,11 +179,7 @@ class TagSet(object):
                 # Parent column links tag to it's group tag.
                 # For example parent tag for noun is POST tag
                 # Parent for m (masculine) is gndr (gender group)
-                if not hasattr(self, tag["parent"]):
-                    setattr(self, tag["parent"], [])
-
-                attr = getattr(self, tag["parent"])
-                attr.append(tag["name"])
+                group_members.setdefault(tag["parent"], []).append(tag["name"])
 
                 # aux is our auxiliary tag to connect our group tags
                 if tag["parent"] != "aux":
@@ -179,26 +192,39 @@ class TagSet(object):
 
                 self.full[tag["name"]] = tag
 
+        for parent, members in group_members.items():
+            setattr(self, parent, tuple(members))
+        self.all = tuple(self.all)
+        self.groups = tuple(self.groups)
+
+        self.group_rank = {group: i for i, group in enumerate(self.groups)}
+        self.tag_rank = {
+            name: self.group_rank[tag["parent"]] for name, tag in self.full.items()
+        }
+
+    @classmethod
+    def load(cls, fname):
+        """
+        Cached constructor: mapping file is parsed once per process
+        (and again only if it was modified)
+        """
+        key = (os.path.abspath(fname), os.path.getmtime(fname))
+        tag_set = cls._loaded.get(key)
+        if tag_set is None:
+            tag_set = cls._loaded[key] = cls(fname)
+        return tag_set
+
     def _get_group_no(self, tag_name):
         """
         Takes tag name and returns the number of the group to which tag belongs
         """
+        return self.tag_rank.get(tag_name, len(self.groups))
 
-        if tag_name in self.full:
-            return self.groups.index(self.full[tag_name]["parent"])
-        else:
-            return len(self.groups)
+    def sort_key(self, tag_name):
+        return self.tag_rank.get(tag_name, len(self.groups)), tag_name
 
     def sort_tags(self, tags):
-        def inner_cmp(a, b):
-            a_group = self._get_group_no(a)
-            b_group = self._get_group_no(b)
-
-            if a_group == b_group:
-                return cmp(a, b)
-            return cmp(a_group, b_group)
-
-        return sorted(tags, cmp=inner_cmp)
+        return sorted(tags, key=self.sort_key)
 
 
 class WordForm(object):
@@ -239,38 +265,63 @@ class Lemma(object):
 
         self.lemma_form = WordForm(word, lemma_form_tags, True)
         self.pos = self.lemma_form.pos
-        self.forms = {}
-        self.common_tags = None
+        self._forms = {}
+        self._common_tags = None
+        # In lazy mode Dictionary sets this to a callable that adds the rest
+        # of the paradigm; it runs on first access to forms/common_tags
+        self.expand = None
+        self.failed = False
 
         self.add_form(self.lemma_form)
 
     def __str__(self):
         return "%s" % self.lemma_form
 
+    def _ensure_expanded(self):
+        if self.expand is not None:
+            expand, self.expand = self.expand, None
+            expand(self)
+
+    @property
+    def forms(self):
+        self._ensure_expanded()
+        return self._forms
+
+    @property
+    def common_tags(self):
+        self._ensure_expanded()
+        return self._common_tags
+
+    @common_tags.setter
+    def common_tags(self, value):
+        self._ensure_expanded()
+        self._common_tags = value
+
     @property
     def lemma_signature(self):
         return (self.word,) + tuple(self.common_tags)
 
     def add_form(self, form):
-        if self.common_tags is not None:
-            self.common_tags = self.common_tags.intersection(form.tags)
+        if self._common_tags is not None:
+            self._common_tags = self._common_tags.intersection(form.tags)
         else:
-            self.common_tags = set(form.tags)
+            self._common_tags = set(form.tags)
 
-        if (form.tags_signature in self.forms and
-                form.form != self.forms[form.tags_signature][0].form):
+        forms = self._forms
+        if (form.tags_signature in forms and
+                form.form != forms[form.tags_signature][0].form):
             doubleform_signal.send(self, tags_signature=form.tags_signature)
 
-            self.forms[form.tags_signature].append(form)
+            forms[form.tags_signature].append(form)
 
             logging.debug(
                 "lemma %s got %s forms with same tagset %s: %s" %
-                (self, len(self.forms[form.tags_signature]),
+                (self, len(forms[form.tags_signature]),
                  form.tags_signature,
                  ", ".join(map(lambda x: x.form,
-                               self.forms[form.tags_signature]))))
+                               forms[form.tags_signature]))))
         else:
-            self.forms[form.tags_signature] = [form]
+            forms[form.tags_signature] = [form]
 
     def _add_tags_to_element(self, el, tags, mapping):
         # if self.pos in tags:
@@ -278,7 +329,7 @@ class Lemma(object):
         # TODO: remove common tags
         # tags = set(tags) - set([self.pos])
         # TODO: translate tags here
-        for one_tag in tags:
+        for one_tag in mapping.sort_tags(tags):
             if one_tag != '':
                 ET.SubElement(el, "g", v=mapping.lt2opencorpora.get(one_tag, one_tag))
 
@@ -299,72 +350,113 @@ class Lemma(object):
         self._add_tags_to_element(l_form, common_tags, mapping)
 
 
+        for form in self.export_forms():
+            output_form = form.form.lower()
+            output_form = translate_func(output_form)
+            el = ET.SubElement(lemma, "f", t=output_form)
+            self._add_tags_to_element(el,
+                                      set(form.tags) - set(common_tags),
+                                      mapping)
+
+        return lemma
+
+    def export_forms(self):
+        """
+        Forms that go to export: the lemma form itself is skipped unless
+        it is the only one
+        """
         for forms in self.forms.values():
             for form in forms:
-                output_form = form.form.lower()
-                output_form = translate_func(output_form)
-                el = ET.Element("f", t=output_form)
-                if form.is_lemma:
-                    if len(self.forms) == 1:
-                        lemma.insert(1, el)
-                else:
-                    lemma.append(el)
+                if not form.is_lemma or len(self.forms) == 1:
+                    yield form
 
-                self._add_tags_to_element(el,
-                                          set(form.tags) - set(common_tags),
-                                          mapping)
+    def export_to_compact(self, i, mapping, tag_id, lang="isv_cyr"):
+        """
+        Same content as export_to_xml as a list:
+        [id, lemma, [common tag ids], [[form, [tag ids]], ...]]
+        tag_id maps OpenCorpora tag name to its id
+        """
+        translate_func = translation_functions[lang]
+        common_tags = list(self.common_tags or set())
+        if not common_tags:
+            return None
+
+        def tag_ids(tags):
+            return [tag_id(mapping.lt2opencorpora.get(one_tag, one_tag))
+                    for one_tag in mapping.sort_tags(tags) if one_tag != '']
+
+        forms = [
+            [translate_func(form.form.lower()),
+             tag_ids(set(form.tags) - set(common_tags))]
+            for form in self.export_forms()
+        ]
+        return [i, translate_func(self.lemma_form.form.lower()),
+                tag_ids(common_tags), forms]
+
+def _adj_slots(num, case, n_masc):
+    """
+    Paradigm template for one (number, case) cell of adjective table.
+    Returns tuple of (from_masc, index, tags): form is taken from masculine
+    "anim/inan" split if from_masc, else directly from the cell.
+    """
+    num_tag = "sing" if num == 'singular' else "plur"
+    slots = []
+    for i, animatedness in enumerate(["anim", "inan"]):
+        if case == "nom" and num == 'singular':
+            sources = [(False, 0), (False, 1), (False, 2)]
+        elif case in ("nom", "acc"):
+            if n_masc == 1:
+                if i == 1:
+                    continue
+                animatedness = ''
+            last = 2 if case == "acc" and num == 'singular' else 1
+            sources = [(True, i), (False, 1), (False, last)]
+        else:
+            if i == 1:
+                continue
+            animatedness = ''
+            sources = ([(False, 0), (False, 0), (False, 1)] if num == 'singular'
+                       else [(False, 0), (False, 0), (False, 0)])
+        for (from_masc, index), gender in zip(sources, ["masc", "neut", "femn"]):
+            tags = frozenset({case, num_tag, gender, animatedness})
+            slots.append((from_masc, index, tags))
+    return tuple(slots)
+
+
+_adj_paradigm_cache = {}
+
+
+def _adj_paradigm(num, case, n_masc, pos):
+    key = (num, case, n_masc, pos)
+    paradigm = _adj_paradigm_cache.get(key)
+    if paradigm is None:
+        paradigm = tuple(
+            (from_masc, index, tags | pos)
+            for from_masc, index, tags in _adj_slots(num, case, n_masc)
+        )
+        _adj_paradigm_cache[key] = paradigm
+    return paradigm
 
-        return lemma
 
 def yield_all_simple_adj_forms(forms_obj, pos):
+    # every adjective shares the same paradigm shape, so slot -> tags table
+    # is computed once per (cell, pos) and forms are just zipped against it
+    pos = frozenset(pos)
     if "casesSingular" in forms_obj:
-        forms_obj['singular'] = forms_obj['casesSingular']
-        forms_obj['plural'] = forms_obj['casesPlural']
-    for num in ['singular', 'plural']:
-        for case, content in forms_obj[num].items():
-            for i, animatedness in enumerate(["anim", "inan"]):
-                if case == "nom":
-                    if num == 'singular':
-                        yield content[0], {case, "sing", "masc", animatedness} | pos
-                        yield content[1], {case, "sing", "neut", animatedness} | pos
-                        yield content[2], {case, "sing", "femn", animatedness} | pos
-                    if num == 'plural':
-                        masc_form = content[0].split("/")
-                        if len(masc_form) == 1:
-                            if i == 1:
-                                continue
-                            else:
-                                animatedness = ''
-                        yield masc_form[i], {case, "plur", "masc", animatedness} | pos
-                        yield content[1], {case, "plur", "neut", animatedness} | pos
-                        yield content[1], {case, "plur", "femn", animatedness} | pos
-                elif case == "acc":
-                    masc_form = content[0].split("/")
-                    if len(masc_form) == 1:
-                        if i == 1:
-                            continue
-                        else:
-                            animatedness = ''
-                    if num == 'singular':
-                        yield masc_form[i], {case, "sing", "masc", animatedness} | pos
-                        yield content[1], {case, "sing", "neut", animatedness} | pos
-                        yield content[2], {case, "sing", "femn", animatedness} | pos
-                    if num == 'plural':
-                        yield masc_form[i], {case, "plur", "masc", animatedness} | pos
-                        yield content[1], {case, "plur", "neut", animatedness} | pos
-                        yield content[1], {case, "plur", "femn", animatedness} | pos
-                else:
-                    animatedness = ''
-                    if i == 1:
-                        continue
-                    if num == 'singular':
-                        yield content[0], {case, "sing", "masc", animatedness} | pos
-                        yield content[0], {case, "sing", "neut", animatedness} | pos
-                        yield content[1], {case, "sing", "femn", animatedness} | pos
-                    if num == 'plural':
-                        yield content[0], {case, "plur", "masc", animatedness} | pos
-                        yield content[0], {case, "plur", "neut", animatedness} | pos
-                        yield content[0], {case, "plur", "femn", animatedness} | pos
+        tables = [('singular', forms_obj['casesSingular']),
+                  ('plural', forms_obj['casesPlural'])]
+    else:
+        tables = [('singular', forms_obj['singular']),
+                  ('plural', forms_obj['plural'])]
+    for num, cases in tables:
+        for case, content in cases.items():
+            masc_form = None
+            n_masc = 0
+            if case == "acc" or (case == "nom" and num == 'plural'):
+                masc_form = content[0].split("/")
+                n_masc = 1 if len(masc_form) == 1 else 2
+            for from_masc, index, tags in _adj_paradigm(num, case, n_masc, pos):
+                yield (masc_form[index] if from_masc else content[index]), tags
 
 def yield_all_noun_forms(forms_obj, pos, columns):
     for case, data in forms_obj.items():
@@ -400,123 +492,153 @@ def yield_all_noun_forms(forms_obj, pos, columns):
 
 VERB_AUX_WORDS = {'(je)', 'sę', '(sųt)', 'ne'}
 
-def yield_all_verb_forms(forms_obj, pos, base):
+PERSON_TAGS = [
+    {'1per', 'sing'},
+    {'2per', 'sing'},
+    {'3per', 'sing'},
+    {'1per', 'plur'},
+    {'2per', 'plur'},
+    {'3per', 'plur'},
+]
+PARTICIPLE_TIMES = [
+    ('prap', {'actv', 'present'}),
+    ('prpp', {'pssv', 'present'}),
+    ('pfap', {'actv', 'past'}),
+    ('pfpp', {'pssv', 'past'}),
+]
+PARTICIPLE_GENDERS = [{'m'}, {'f'}, {'n'}]
+
+
+def _build_verb_slot_tags():
+    """
+    Slot -> tags table shared by all verbs (without POS tags of the lemma).
+    Variant tables are stored under "<slot>:<variant tag>".
+    """
+    tables = {
+        'infinitive': [{"INFN"}],
+        'perfect': [
+            {'m', 'past', 'sing'},
+            {'f', 'past', 'sing'},
+            {'n', 'past', 'sing'},
+            {'past', 'plur'},
+        ],
+        'conditional': [{'conditional'} | tags for tags in PERSON_TAGS],
+        'imperative': [{'impr', '2per'}, {'impr', '1per', 'plur'}, {'impr', '2per', 'plur'}],
+        'gerund': [{"NOUN", "V2NOUN"}],
+    }
+    for time in ['present', 'imperfect', 'future']:
+        tables[time] = [{time} | tags for tags in PERSON_TAGS]
+        for variant in ["V-ju", "V-m"]:
+            tables[f"{time}:{variant}"] = [{time, variant} | tags for tags in PERSON_TAGS]
+    for time, meta_tag in PARTICIPLE_TIMES:
+        tables[time] = [meta_tag | PARTICIPLE_GENDERS[0]]
+        # every participle written as several parts gets variant tags,
+        # first three parts are V-ju, the next three are V-m
+        tables[f"{time}:alt"] = [
+            meta_tag | PARTICIPLE_GENDERS[i % 3] | ({"V-ju"} if i < 3 else {"V-m"})
+            for i in range(6)
+        ]
+    return {
+        name: tuple(frozenset(tags) for tags in table)
+        for name, table in tables.items()
+    }
+
 
+VERB_SLOT_TAGS = _build_verb_slot_tags()
+_verb_paradigm_cache = {}
+
+
+def _verb_paradigm(pos):
+    paradigm = _verb_paradigm_cache.get(pos)
+    if paradigm is None:
+        paradigm = {
+            name: tuple(tags | pos for tags in table)
+            for name, table in VERB_SLOT_TAGS.items()
+        }
+        _verb_paradigm_cache[pos] = paradigm
+    return paradigm
+
+
+def split_participle(participle):
+    """
+    "dělajųći (-a, -e)" -> ["dělajųći", "-a", "-e"]
+    (chained str.replace measured faster than a single regex pass here)
+    """
+    # TODO: will fuck up if multi-word verb
+    return (participle
+            .replace("ne ", "")
+            .replace("ši sá", "ša sę").replace("ši sé", "še sę")   # THIS MAKES PARSER NON STANDARD COMPLIANT
+            .replace(" sę", "")
+            .replace(",", "").replace("(", "").replace(")", "")
+            .split(" "))
+
+
+def yield_all_verb_forms(forms_obj, pos, base):
+    paradigm = _verb_paradigm(frozenset(pos))
     is_byti = forms_obj['infinitive'] == 'bytì'
-    # if forms_obj['infinitive'].replace("ì", "i") != base:
-        # print(forms_obj['infinitive'], base)
 
     # ====== Infinitive ======
-    yield forms_obj['infinitive'], pos | {"INFN"}
+    yield forms_obj['infinitive'], paradigm['infinitive'][0]
 
     # ====== L-particle ======
     # ['pluperfect', 'perfect', 'conditional']:
-    tags = [
-        {'m', 'past', 'sing'},
-        {'f', 'past', 'sing'},
-        {'n', 'past', 'sing'},
-        {'past', 'plur'},
-    ]
     forms_person = forms_obj['perfect']
     base_forms = forms_person[2:5] + forms_person[7:8]
-    for form, meta in zip(base_forms, tags):
-        parts = " ".join([p for p in form.split(" ") if p not in VERB_AUX_WORDS])
-        yield parts, meta | pos | {'past'}
+    for form, tags in zip(base_forms, paradigm['perfect']):
+        if " " in form:
+            form = " ".join([p for p in form.split(" ") if p not in VERB_AUX_WORDS])
+        yield form, tags
 
     # ====== Conditional ======
     # ['conditional']:
     if is_byti:
-        tags = [
-            {'1per', 'sing'},
-            {'2per', 'sing'},
-            {'3per', 'sing'},
-
-            {'1per', 'plur'},
-            {'2per', 'plur'},
-            {'3per', 'plur'},
-        ]
         time = 'conditional'
         different_forms = forms_obj[time][:3] + forms_obj[time][5:8]
-        for entry, one_tag in zip(different_forms, tags):
-            subentry = entry.split(" ")[0]
-            yield subentry, pos | {time} | one_tag
+        for entry, tags in zip(different_forms, paradigm[time]):
+            yield entry.split(" ")[0], tags
 
-        
     # ====== Future ======
     # ['future']
     # future uses infinitive and aux verbs
 
     # ====== Present and Imperfect ======
     # ['present', 'imperfect']
-    tags = [
-        {'1per', 'sing'},
-        {'2per', 'sing'},
-        {'3per', 'sing'},
-        {'1per', 'plur'},
-        {'2per', 'plur'},
-        {'3per', 'plur'},
-    ]
     relevant_times = ['present', 'imperfect']
     if is_byti:
         relevant_times += ['future']
     for time in relevant_times:
-        for entry, one_tag in zip(forms_obj[time], tags):
+        plain_tags = paradigm[time]
+        variant_tags = (paradigm[f"{time}:V-ju"], paradigm[f"{time}:V-m"])
+        for person, entry in enumerate(forms_obj[time][:6]):
             if entry.endswith(" (je)"):
                 entry = entry[:-5] + "," + "je"
 
-            subentries = entry.split(",")
-            subentry_tags = [{"V-ju"}, {'V-m'}]
-            if len(subentries) == 1:
-                subentry_tags = [set()]
-            for subentry, add_tag in zip(subentries, subentry_tags):
-                yield subentry, pos | {time} | add_tag | one_tag
+            if "," not in entry:
+                yield entry, plain_tags[person]
+                continue
+            for subentry, tags in zip(entry.split(","), variant_tags):
+                yield subentry, tags[person]
 
     # ====== Imperative ======
     imperatives = forms_obj['imperative'].split(',')
-    tags = [
-        {'2per'}, {'1per', 'plur'}, {'2per', 'plur'}
-    ]
-    for subentry, add_tag in zip(imperatives, tags):
-        yield subentry, pos | {'impr'} | add_tag
+    yield from zip(imperatives, paradigm['imperative'])
 
     # ====== Participles ======
-    tags = [
-        {'m'}, {'f'}, {'n'}
-    ]
-    for time, meta_tag in zip(
-        ['prap', 'prpp', 'pfap', 'pfpp'],
-        [{'actv', 'present'}, {'pssv', 'present'}, {'actv', 'past'}, {'pssv', 'past'}]
-    ):
-        # TODO: will fuck up if multi-word verb
-        parts = (forms_obj[time]
-            .replace("ne ", "")
-            .replace("ši sá", "ša sę").replace("ši sé", "še sę")   # THIS MAKES PARSER NON STANDARD COMPLIANT
-            .replace(" sę", "")
-            .replace(",", "").replace("(", "") .replace(")", "")
-            .split(" "))
-
-        subentry_tags = [{"V-ju"}, {'V-m'}]
-        if len(parts) == 1:
-            subentry_tags = [set()]
+    for time, _ in PARTICIPLE_TIMES:
+        parts = split_participle(forms_obj[time])
+        if len(parts) > 6:
+            raise ParadigmError("participle-parts", f"too many participle parts: {forms_obj[time]}")
 
+        slot_tags = paradigm[time] if len(parts) == 1 else paradigm[f"{time}:alt"]
         for i, entry in enumerate(parts):
-            if i >= 6:
-                print(forms_obj)
-                raise AssertionError
-
-            current_tag = tags[i % 3] | subentry_tags[i >= 3]
             if i % 3 == 0:
                 base_part = entry
-                yield entry, pos | meta_tag | current_tag
-            else:
-                if "-" in entry:
-                    full_entry = base_part[:-1] + entry[1:]
-                else:
-                    full_entry = entry
-                yield full_entry, pos | meta_tag | current_tag
+            elif "-" in entry:
+                entry = base_part[:-1] + entry[1:]
+            yield entry, slot_tags[i]
 
     # ====== Gerund ======
-    yield forms_obj['gerund'], pos | {"NOUN", "V2NOUN"}
+    yield forms_obj['gerund'], paradigm['gerund'][0]
 
 
 def iterate_json(forms_obj, pos_data, base):
@@ -561,20 +683,14 @@ def iterate_json(forms_obj, pos_data, base):
             columns = forms_obj['columns']
             yield from yield_all_noun_forms(forms_obj['cases'], pos_data, columns)
         else:
-            print("1, smth else", forms_obj['type'])
-            raise AssertionError
+            raise ParadigmError("unknown-type", f"unexpected {pos} type: {forms_obj['type']}")
     elif "verb" in pos:
-        error = False
         for entry, tag in yield_all_verb_forms(forms_obj, pos_data, base):
-            if "ERROR" in entry:
-                error = True
             if entry.endswith(" sę"):
                 entry = entry[:-3]
             if base.startswith("ne "):
                 entry = entry[3:]
             yield entry, tag
-        if error:
-            print(forms_obj, pos_data, base)
     elif "noun" in pos:
         yield from yield_all_noun_forms(forms_obj, pos_data, ['singular', 'plural'])
     return base, pos_data
@@ -584,147 +700,405 @@ base_tag_set = {}
 INDECLINABLE_POS = {'adverb', 'conjunction', 'preposition', 'interjection', 'particle', 'pronoun', 'numeral'} 
 
 
+def form_signature(lemma):
+    """
+    Paradigm signature used to find duplicate pronouns:
+    (tags signature, first form) of every form besides the lemma itself
+    """
+    return tuple(
+        (k, v[0].form) for i, (k, v) in enumerate(lemma.forms.items())
+        if i != 0
+    )
+
+
+class PronounIndex(object):
+    """
+    Groups exportable pronoun lemmas by form signature.
+    First lemma of every cluster is exported, the rest are duplicates.
+    """
+    def __init__(self, lemmas):
+        self.clusters = {}
+        for lemma in lemmas:
+            # lemmas without common tags are not exported at all
+            if not lemma.common_tags or "pron" not in lemma.lemma_form.tags:
+                continue
+            signature = form_signature(lemma)
+            if signature:
+                self.clusters.setdefault(signature, []).append(lemma)
+
+        self._duplicate_ids = {
+            id(lemma)
+            for cluster in self.clusters.values() for lemma in cluster[1:]
+        }
+
+    def is_duplicate(self, lemma):
+        return id(lemma) in self._duplicate_ids
+
+    def duplicate_clusters(self):
+        return [cluster for cluster in self.clusters.values() if len(cluster) > 1]
+
+
+# errors that mean the words_forms entry itself is broken: a bad paradigm
+# or a missing field; anything else is a bug and is never skipped
+MALFORMED_ENTRY_ERRORS = (ParadigmError, KeyError, IndexError)
+
+
+class LoadReport(object):
+    """
+    Diagnostics collected while loading the dictionary, instead of printing
+    them: counts and a few samples per kind, and every issue per word_id
+    """
+    def __init__(self, max_samples=5):
+        self.max_samples = max_samples
+        self.counts = Counter()
+        self.skipped = Counter()
+        self.samples = defaultdict(list)
+        self.by_word_id = defaultdict(list)
+
+    def add(self, kind, word_id, message, skipped=False):
+        self.counts[kind] += 1
+        if skipped:
+            self.skipped[kind] += 1
+        if len(self.samples[kind]) < self.max_samples:
+            self.samples[kind].append((word_id, message))
+        self.by_word_id[word_id].append((kind, message))
+
+    def add_error(self, word_id, error):
+        kind = error.kind if isinstance(error, ParadigmError) else "malformed"
+        self.add(kind, word_id, f"{type(error).__name__}: {error}", skipped=True)
+
+    def summary(self):
+        lines = []
+        for kind, count in self.counts.most_common():
+            skipped = f", {self.skipped[kind]} skipped" if self.skipped[kind] else ""
+            lines.append(f"{kind}: {count}{skipped}")
+            for word_id, message in self.samples[kind]:
+                lines.append(f"    {word_id}: {message}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "counts": dict(self.counts),
+            "skipped": dict(self.skipped),
+            "samples": dict(self.samples),
+            "by_word_id": dict(self.by_word_id),
+        }
+
+
 class Dictionary(object):
-    def __init__(self, fname, mapping):
+    def __init__(self, fname, mapping, strict=True, lazy=False,
+                 pos_filter=None, word_ids=None):
+        """
+        By default the first broken entry aborts loading; with strict=False
+        broken entries are skipped and recorded in self.report instead.
+        Diagnostics in self.report are logged after loading.
+
+        lazy=True keeps raw paradigm of every lemma and expands it only when
+        lemma forms are read (e.g. by export). pos_filter (POS names as in
+        infer_pos) and word_ids restrict which entries are loaded at all.
+        """
         if not mapping:
             mapping = os.path.join(os.path.dirname(__file__), "mapping_isv.csv")
 
         self.mapping = mapping
+        self.strict = strict
+        self.lazy = lazy
+        self.pos_filter = set(pos_filter) if pos_filter is not None else None
+        self.word_ids = {str(word_id) for word_id in word_ids} if word_ids is not None else None
+        self.report = LoadReport()
         self.lemmas = {}
+        self._pronoun_index = None
 
-        counter_multiword = 0
-        counter_multiword_verb = 0
-        counter_se = 0
-        with open(fname, "r", encoding="utf8") as fp:
+        # words_forms.txt may as well be .gz/.bz2/.zst
+        with open_compressed(fname, "rt") as fp:
             next(fp)
-            for i, line in enumerate(fp):
-                raw_data, forms, pos_formatted = line.split("\t")
-                word_id, isv_lemma, addition, pos, *rest = ujson.loads(raw_data)
-                forms_obj_array = ujson.loads(forms)
-
-                # HOTFIX TIME!
-                if word_id == "36454":
-                    pos = "adj."
-                if word_id == "36649":
-                    pos = "f."
-
-                add_tags = [{f"VF-{form_num+1}"} for form_num, _ in enumerate(forms_obj_array)]
-
-                if len(add_tags) == 1:
-                    add_tags = [set()]
-
-                isv_lemmas = isv_lemma.split(",")
-                if "m./f." in pos:
-                    isv_lemmas = [isv_lemma, isv_lemma]
-                    add_tags = [{'masc'}, {'femn'}]
-                for add_tag, forms_obj, isv_lemma_current in zip(add_tags, forms_obj_array, isv_lemmas):
-
-                    isv_lemma_current = isv_lemma_current.strip()
-                    details_set = set(getArr(pos)) | add_tag
-                    # if infer_pos is None, then fallback to the first form
-                    local_pos = infer_pos(details_set) or pos
-                    if local_pos == "noun": 
-                        details_set |= {'noun'}
-
-                    if not isinstance(forms_obj, dict):
-                        if forms_obj != '':
-                            # add isolated lemma
-
-                            if local_pos in INDECLINABLE_POS and " " not in isv_lemma_current:
-                                current_lemma = Lemma(
-                                    isv_lemma_current,
-                                    lemma_form_tags=details_set,
-                                )
-                                current_lemma.add_form(WordForm(
-                                    isv_lemma_current,
-                                    tags=details_set,
-                                ))
-                                self.add_lemma(current_lemma)
-                            continue
-                    if " " in isv_lemma_current and isinstance(forms_obj, dict):
-                        splitted = isv_lemma_current.split()
-                        if len(splitted) == 2 and "sę" in splitted:
-                            counter_se += 1
-                        else:
-                            counter_multiword += 1
-                            # TODO TODO XXX
-                            if "verb" not in pos_formatted:
-                                counter_multiword_verb += 1
-                                print(isv_lemma_current.split(), pos_formatted)
-                                print(forms_obj)
-                            else:
-                                print(isv_lemma_current.split(), pos_formatted, forms_obj['infinitive'])
-                        # continue
+            for line_no, line in enumerate(fp, 2):
+                try:
+                    parsed = self._parse_line(line)
+                except MALFORMED_ENTRY_ERRORS as e:
+                    if strict:
+                        raise
+                    self.report.add_error(f"line {line_no}", e)
+                    continue
+                if parsed is None:
+                    continue
 
+                word_id, pos, pos_formatted, entries = parsed
+                for add_tag, forms_obj, isv_lemma_current in entries:
+                    try:
+                        self._load_entry(
+                            word_id, pos, pos_formatted,
+                            add_tag, forms_obj, isv_lemma_current.strip()
+                        )
+                    except MALFORMED_ENTRY_ERRORS as e:
+                        if strict:
+                            raise
+                        self.report.add_error(word_id, e)
+
+        logging.info("Dictionary %s loaded: %s lemmas" % (fname, len(self.lemmas)))
+        if self.report.counts:
+            logging.info("Dictionary %s diagnostics:\n%s" % (fname, self.report.summary()))
+
+    def _parse_line(self, line):
+        try:
+            raw_data, forms, pos_formatted = line.split("\t")
+            word_id, isv_lemma, addition, pos, *rest = ujson.loads(raw_data)
+        except ValueError as e:
+            raise ParadigmError("malformed-line", str(e)) from e
+
+        # HOTFIX TIME!
+        if word_id == "36454":
+            pos = "adj."
+        if word_id == "36649":
+            pos = "f."
+
+        # filtered out entries are skipped before their paradigms are parsed
+        if self.word_ids is not None and str(word_id) not in self.word_ids:
+            return None
+        if self.pos_filter is not None and (infer_pos(getArr(pos)) or pos) not in self.pos_filter:
+            return None
+        try:
+            forms_obj_array = ujson.loads(forms)
+        except ValueError as e:
+            raise ParadigmError("malformed-line", str(e)) from e
+
+        add_tags = [{f"VF-{form_num+1}"} for form_num, _ in enumerate(forms_obj_array)]
+
+        if len(add_tags) == 1:
+            add_tags = [set()]
+
+        isv_lemmas = isv_lemma.split(",")
+        if "m./f." in pos:
+            isv_lemmas = [isv_lemma, isv_lemma]
+            add_tags = [{'masc'}, {'femn'}]
+        return word_id, pos, pos_formatted, zip(add_tags, forms_obj_array, isv_lemmas)
+
+    def _load_entry(self, word_id, pos, pos_formatted, add_tag, forms_obj, isv_lemma_current):
+        details_set = set(getArr(pos)) | add_tag
+        # if infer_pos is None, then fallback to the first form
+        local_pos = infer_pos(details_set) or pos
+        if self.pos_filter is not None and local_pos not in self.pos_filter:
+            return
+        if local_pos == "noun":
+            details_set |= {'noun'}
+
+        if not isinstance(forms_obj, dict):
+            if forms_obj != '':
+                # add isolated lemma
+
+                if local_pos in INDECLINABLE_POS and " " not in isv_lemma_current:
                     current_lemma = Lemma(
                         isv_lemma_current,
                         lemma_form_tags=details_set,
                     )
-                    number_forms = set()
-                    for current_form, tag_set in iterate_json(forms_obj, details_set, isv_lemma_current):
-                        if "/" in current_form:
-                            all_forms = current_form.split("/")
-                        else:
-                            all_forms = [current_form]
-                        if len(all_forms) > 2:
-                            print(isv_lemma_current, all_forms)
-                            raise NameError
-                        all_tags = [{f"V-flex-{form_num+1}"} for form_num, _ in enumerate(all_forms)]
-
-                        if len(all_forms) == 1:
-                            all_tags = [set()]
-                        for single_form, add_tag in zip(all_forms, all_tags):
-                            current_lemma.add_form(WordForm(
-                                single_form,
-                                tags=tag_set | add_tag,
-                            ))
-                        if local_pos in {"noun", "numeral"}:
-                            number_forms |= {one_tag for one_tag in tag_set if one_tag in ['singular', 'plural']}
-                    if len(number_forms) == 1:
-                        if number_forms != {"singular"} and number_forms != {"plural"}:
-                            print(number_forms, current_lemma.lemma_form.form)
-                            raise AssertionError
-                        numeric = {"Sgtm"} if number_forms == {"singular"} else {"Pltm"}
-                        current_lemma.common_tags |= numeric
-                    if local_pos == "verb":
-                        if forms_obj['infinitive'].replace("ì", "i") != isv_lemma_current:
-                            current_lemma.lemma_form.form = forms_obj['infinitive']
-                    if local_pos == "pronoun":
-                        # this will be processed later
-                        pass
-                    self.add_lemma(current_lemma)
-        print(counter_multiword)
-        print(counter_multiword_verb)
-        print(counter_se)
-
-    def add_lemma(self, lemma):
-        if lemma is not None:
+                    current_lemma.add_form(WordForm(
+                        isv_lemma_current,
+                        tags=details_set,
+                    ))
+                    self.add_lemma(current_lemma, key=(word_id, isv_lemma_current, local_pos))
+                return
+        if " " in isv_lemma_current and isinstance(forms_obj, dict):
+            splitted = isv_lemma_current.split()
+            if len(splitted) == 2 and "sę" in splitted:
+                self.report.add("reflexive", word_id, isv_lemma_current)
+            # TODO TODO XXX
+            elif "verb" not in pos_formatted:
+                self.report.add("multiword", word_id, f"{splitted} {pos_formatted.strip()}")
+            else:
+                self.report.add("multiword-verb", word_id, f"{splitted} {forms_obj['infinitive']}")
+
+        current_lemma = Lemma(
+            isv_lemma_current,
+            lemma_form_tags=details_set,
+        )
+        if local_pos == "verb":
+            if forms_obj['infinitive'].replace("ì", "i") != isv_lemma_current:
+                current_lemma.lemma_form.form = forms_obj['infinitive']
+        if local_pos == "pronoun":
+            # this will be processed later
+            pass
+
+        def expand(lemma):
+            self._expand_lemma(lemma, word_id, forms_obj, details_set, local_pos)
+
+        if self.lazy:
+            current_lemma.expand = expand
+        else:
+            expand(current_lemma)
+        self.add_lemma(current_lemma, key=(word_id, isv_lemma_current) + tuple(sorted(add_tag)))
+
+    def _expand_lemma(self, current_lemma, word_id, forms_obj, details_set, local_pos):
+        """
+        Adds all forms from the raw paradigm to the lemma.
+        Errors raised here while expanding lazily are reported (or raised in
+        strict mode) the same way as during eager loading
+        """
+        isv_lemma_current = current_lemma.word
+        try:
+            number_forms = set()
+            for current_form, tag_set in iterate_json(forms_obj, details_set, isv_lemma_current):
+                if "/" in current_form:
+                    all_forms = current_form.split("/")
+                else:
+                    all_forms = [current_form]
+                if len(all_forms) > 2:
+                    raise ParadigmError("slash-forms", f"{isv_lemma_current}: {all_forms}")
+                if "ERROR" in current_form:
+                    self.report.add("error-form", word_id, f"{isv_lemma_current}: {current_form}")
+                all_tags = [{f"V-flex-{form_num+1}"} for form_num, _ in enumerate(all_forms)]
+
+                if len(all_forms) == 1:
+                    all_tags = [set()]
+                for single_form, add_tag in zip(all_forms, all_tags):
+                    current_lemma.add_form(WordForm(
+                        single_form,
+                        tags=tag_set | add_tag,
+                    ))
+                if local_pos in {"noun", "numeral"}:
+                    number_forms |= {one_tag for one_tag in tag_set if one_tag in ['singular', 'plural']}
+            if len(number_forms) == 1:
+                if number_forms != {"singular"} and number_forms != {"plural"}:
+                    raise ParadigmError(
+                        "number-forms", f"{current_lemma.lemma_form.form}: {number_forms}")
+                numeric = {"Sgtm"} if number_forms == {"singular"} else {"Pltm"}
+                current_lemma.common_tags |= numeric
+        except MALFORMED_ENTRY_ERRORS as e:
+            current_lemma.failed = True
+            if not self.lazy or self.strict:
+                raise
+            self.report.add_error(word_id, e)
+
+    def add_lemma(self, lemma, key=None):
+        if lemma is None:
+            return
+        if lemma.failed:
+            return
+        self._pronoun_index = None
+        if self.lazy:
+            # signature needs expanded forms, it is applied in iter_lemmas
+            self.lemmas[key] = lemma
+        else:
             self.lemmas[lemma.lemma_signature] = lemma
 
+    def iter_lemmas(self):
+        """
+        Lemmas unique by signature, in the order they were loaded.
+        In lazy mode this expands every lemma.
+        """
+        if not self.lazy:
+            return self.lemmas.values()
+        unique = {}
+        for lemma in self.lemmas.values():
+            signature = lemma.lemma_signature
+            if not lemma.failed:
+                unique[signature] = lemma
+        return unique.values()
+
+    @property
+    def pronoun_index(self):
+        """
+        Built once and shared by exports to all alphabets
+        """
+        if self._pronoun_index is None:
+            self._pronoun_index = PronounIndex(self.iter_lemmas())
+        return self._pronoun_index
+
+    def iter_exported_lemmas(self):
+        """
+        Yields (lemma id, lemma) for export; ids are kept stable even
+        for lemmas that are skipped as duplicates
+        """
+        pronoun_index = self.pronoun_index
+        for i, lemma in enumerate(self.iter_lemmas()):
+            if not pronoun_index.is_duplicate(lemma):
+                yield i + 1, lemma
+
     def export_to_xml(self, fname, lang="isv_cyr"):
-        tag_set_full = TagSet(self.mapping)
+        tag_set_full = TagSet.load(self.mapping)
         root = ET.Element("dictionary", version="0.2", revision="1")
         tree = ET.ElementTree(root)
         root.append(export_grammemes_description_to_xml(tag_set_full))
         lemmata = ET.SubElement(root, "lemmata")
-        known_pronouns = {}
-
-        for i, lemma in enumerate(self.lemmas.values()):
-            lemma_xml = lemma.export_to_xml(i + 1, tag_set_full, lang=lang)
+        for lemma_id, lemma in self.iter_exported_lemmas():
+            lemma_xml = lemma.export_to_xml(lemma_id, tag_set_full, lang=lang)
             if lemma_xml is not None:
-                if "pron" in lemma.lemma_form.tags:
-                    signature = "|".join(
-                        f"{k}: {v[0].form}" for i, (k, v) in enumerate(lemma.forms.items())
-                        if i != 0
-                    )
-
-                    if signature:
-                        if signature in known_pronouns:
-                            # print(known_pronouns[signature], "<-", lemma.lemma_form.form)
-                            continue
-                        else:
-                            known_pronouns[signature] = lemma.lemma_form.form
-                            # print(f"=> SAVING: {lemma.lemma_form.form}")
                 lemmata.append(lemma_xml)
 
-        tree.write(fname, encoding="utf-8")
+        # compressed outputs (out.xml.gz etc) are compressed in background
+        with open_output(fname) as fp:
+            tree.write(fp, encoding="utf-8")
+
+    def export_to_compact(self, fname, lang="isv_cyr"):
+        """
+        Newline-delimited JSON alternative to export_to_xml.
+        First line is the header with tag table, every next line is either
+        a lemma record (see Lemma.export_to_compact) or, for tags missing
+        from the header, {"tag": id, "name": name} defined before first use
+        """
+        tag_set_full = TagSet.load(self.mapping)
+        tag_names = list(dict.fromkeys(tag_set_full.lt2opencorpora.values()))
+        tag_ids = {name: i for i, name in enumerate(tag_names)}
+
+        with open_output(fname) as fp:
+            def write_line(obj):
+                fp.write((ujson.dumps(obj, ensure_ascii=False) + "\n").encode("utf8"))
+
+            def tag_id(name):
+                if name not in tag_ids:
+                    tag_ids[name] = len(tag_ids)
+                    write_line({"tag": tag_ids[name], "name": name})
+                return tag_ids[name]
+
+            header = {
+                "format": COMPACT_FORMAT, "version": COMPACT_VERSION,
+                "lang": lang, "tags": tag_names,
+            }
+            write_line(header)
+            for lemma_id, lemma in self.iter_exported_lemmas():
+                record = lemma.export_to_compact(lemma_id, tag_set_full, tag_id, lang=lang)
+                if record is not None:
+                    write_line(record)
+
+
+COMPACT_FORMAT = "isv-morph-ndjson"
+COMPACT_VERSION = 1
+
+
+def _parse_compact_header(fname, line):
+    header = ujson.loads(line)
+    if header.get("format") != COMPACT_FORMAT:
+        raise ValueError("%s is not %s file" % (fname, COMPACT_FORMAT))
+    return header
+
+
+def compact_header(fname):
+    """
+    Header of file written by Dictionary.export_to_compact
+    ("lang" it was exported in, tag table, ...)
+    """
+    with open_compressed(fname, "rt") as fp:
+        return _parse_compact_header(fname, next(fp))
+
+
+def iterate_compact(fname):
+    """
+    Streams lemmas from file written by Dictionary.export_to_compact.
+    Yields dicts: {"id", "lemma", "tags", "forms": [(form, tags), ...]}
+    with tag names resolved
+    """
+    with open_compressed(fname, "rt") as fp:
+        header = _parse_compact_header(fname, next(fp))
+        tag_names = header["tags"]
+        for line in fp:
+            record = ujson.loads(line)
+            if isinstance(record, dict):
+                tag_names.append(record["name"])
+                continue
+            lemma_id, lemma, tags, forms = record
+            yield {
+                "id": lemma_id,
+                "lemma": lemma,
+                "tags": [tag_names[t] for t in tags],
+                "forms": [(form, [tag_names[t] for t in form_tags])
+                          for form, form_tags in forms],
+            }
@@ -0,0 +1,165 @@
+import gzip
+import json
+import argparse
+from itertools import chain, islice
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+
+from chat_export import iterate_contents
+from lemma_index import LemmaIndex
+from normalization import make_string_standard
+
+# per-process state, set up by init_worker
+_index = None
+_lemma_cache = {}
+
+
+def init_worker(index_fname):
+    global _index
+    _index = LemmaIndex(index_fname)
+    _lemma_cache.clear()
+
+
+def count_contents(contents):
+    """
+    Counts lemmas and unknown words in a batch of messages.
+    Returns (number of messages, lemma counter, unknown words counter)
+    """
+    lem_counter = Counter()
+    unk_counter = Counter()
+    n_messages = 0
+    for content in contents:
+        n_messages += 1
+        for word in make_string_standard(content).split():
+            if word not in _lemma_cache:
+                lemmas = _index.lookup(word)
+                _lemma_cache[word] = lemmas[0] if lemmas else None
+            selected_form = _lemma_cache[word]
+            if selected_form is not None:
+                lem_counter[selected_form] += 1
+            else:
+                unk_counter[word] += 1
+    return n_messages, lem_counter, unk_counter
+
+
+def count_export(fname):
+    return count_contents(iterate_contents(fname))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def collect_stats(exports, index_fname, processes=None, batch_size=5000):
+    """
+    Shards exports across worker processes and merges their counters.
+    With at least as many exports as workers every worker reads whole
+    files, otherwise messages are streamed to workers in batches.
+    """
+    processes = processes or cpu_count()
+    n_messages = 0
+    lem_counter = Counter()
+    unk_counter = Counter()
+
+    with Pool(processes, initializer=init_worker,
+              initargs=(index_fname,)) as pool:
+        if len(exports) >= processes:
+            results = pool.imap_unordered(count_export, exports)
+        else:
+            contents = chain.from_iterable(
+                iterate_contents(fname) for fname in exports)
+            results = pool.imap_unordered(
+                count_contents, batched(contents, batch_size))
+
+        for shard_messages, shard_lemmas, shard_unknown in results:
+            n_messages += shard_messages
+            lem_counter.update(shard_lemmas)
+            unk_counter.update(shard_unknown)
+
+    return n_messages, lem_counter, unk_counter
+
+
+def save_stats(fname, exports, n_messages, lem_counter, unk_counter, top=100):
+    # counts are stored already sorted, so top-N of any size is a prefix
+    data = {
+        "exports": exports,
+        "messages": n_messages,
+        "top": top,
+        "lemmas": lem_counter.most_common(),
+        "unknown": unk_counter.most_common(),
+    }
+    with gzip.open(fname, "wt", encoding="utf8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_stats(fname):
+    with gzip.open(fname, "rt", encoding="utf8") as f:
+        return json.load(f)
+
+
+def plot_stats(stats, top=None, prefix="tmp_"):
+    import pandas as pd
+    from matplotlib import pyplot as plt
+
+    top = top or stats["top"]
+    for i, key in enumerate(["unknown", "lemmas"]):
+        data = stats[key][:top]
+
+        df = pd.DataFrame(data)
+
+        df[0] = (1 + pd.Series(range(len(data)))).astype(str) + ". " + df[0]
+        df = df.rename(columns={0: 'sloveso', 1: 'čestota'})
+        df = df.set_index('sloveso')
+
+        fig, ax = plt.subplots(facecolor='white', figsize=(20, 70),)
+
+        df.plot(kind='barh', ax=ax, color='lightslategray', fontsize=20)
+        ax.set_clip_on(False)
+
+        plt.savefig(f'{prefix}{i}.png')
+        plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Lemma statistics over Discord chat exports')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    count_parser = subparsers.add_parser(
+        'count', help='count lemmas and unknown words')
+    count_parser.add_argument('exports', nargs='+')
+    count_parser.add_argument(
+        '--index', required=True, help='lemma index built by lemma_index.py')
+    count_parser.add_argument('--out', default='corpus_stats.json.gz')
+    count_parser.add_argument('--processes', type=int, default=None)
+    count_parser.add_argument('--batch-size', type=int, default=5000)
+    count_parser.add_argument('--top', type=int, default=100)
+
+    plot_parser = subparsers.add_parser(
+        'plot', help='plot top-N from saved statistics')
+    plot_parser.add_argument('stats')
+    plot_parser.add_argument('--top', type=int, default=None)
+    plot_parser.add_argument('--prefix', default='tmp_')
+
+    args = parser.parse_args()
+
+    if args.command == 'count':
+        n_messages, lem_counter, unk_counter = collect_stats(
+            args.exports, args.index,
+            processes=args.processes, batch_size=args.batch_size)
+        save_stats(args.out, args.exports, n_messages,
+                   lem_counter, unk_counter, top=args.top)
+
+        print(n_messages)
+        print(len(lem_counter))
+        print(len(unk_counter))
+        for word, cnt in unk_counter.most_common(10):
+            print(word, cnt)
+
+    if args.command == 'plot':
+        plot_stats(load_stats(args.stats), top=args.top, prefix=args.prefix)
@@ -0,0 +1,126 @@
+import argparse
+
+from convert import translation_functions
+from lemma_index import LemmaIndex, build_index, load_pairs
+from suggestions import flatten
+from tokenizer import WORD, tokenize
+
+# restored candidates for this many distinct words are kept in memory,
+# so a repeated word is a single dict lookup
+RESTORE_CACHE_SIZE = 200000
+
+
+def iterate_flat_pairs(forms):
+    """
+    (word without any diacritics, form) pairs for build_index
+    """
+    for form in forms:
+        yield flatten(form), form
+
+
+def build_restoration_index(pairs, fname):
+    """
+    pairs are (surface form, lemma) as produced for lemma_index, in the
+    orthography the diacritics should be restored to (isv_etm for full
+    etymological spelling, isv_lat for the standard one)
+    """
+    forms = list(dict.fromkeys(form for form, _ in pairs if " " not in form))
+    return build_index(iterate_flat_pairs(forms), fname)
+
+
+class DiacriticRestorer(object):
+    """
+    Maps a word typed without diacritics (or with only some of them) to
+    every dictionary form it could stand for. Unlike char_substitutes
+    one plain letter may turn into any of its variants (e -> ě/ę/e,
+    dž -> đ), because the whole word is compared after flattening.
+    """
+    def __init__(self, fname):
+        self.index = LemmaIndex(fname)
+        self._cache = {}
+
+    def close(self):
+        self.index.close()
+
+    def candidates(self, word):
+        """
+        Returns list of dictionary forms for word (empty if unknown)
+        """
+        word = word.lower()
+        found = self._cache.get(word)
+        if found is None:
+            if len(self._cache) >= RESTORE_CACHE_SIZE:
+                self._cache.clear()
+            found = self._cache[word] = self.index.lookup(flatten(word))
+        return found
+
+    def candidates_many(self, words):
+        return [self.candidates(word) for word in words]
+
+    def restore(self, word):
+        """
+        All candidates joined with "/" as dodavaj_bukvy does,
+        unknown words are returned unchanged
+        """
+        found = self.candidates(word)
+        if not found:
+            return word
+        return "/".join(_same_case(word, form) for form in found)
+
+    def disambiguate(self, text, model):
+        """
+        Returns [(start, end, best candidate, score), ...] for every word
+        of text, candidates chosen in context by model
+        (ngram_model.NgramModel); unknown words are kept lowercased
+        """
+        spans = [(start, end) for start, end, kind in tokenize(text) if kind == WORD]
+        lattice = [self.candidates(text[start:end]) or [text[start:end].lower()]
+                   for start, end in spans]
+        return [(start, end, best, score) for (start, end), (best, score)
+                in zip(spans, model.decode(lattice))]
+
+    def restore_text(self, text, model=None):
+        """
+        Batch version for a whole text: every word is restored in place,
+        everything between the words is kept as it is. With model only
+        the best candidate is put in, otherwise all of them
+        """
+        parts = []
+        last = 0
+        if model is not None:
+            for start, end, best, _ in self.disambiguate(text, model):
+                parts.append(text[last:start])
+                parts.append(_same_case(text[start:end], best))
+                last = end
+        else:
+            for start, end, kind in tokenize(text):
+                if kind == WORD:
+                    parts.append(text[last:start])
+                    parts.append(self.restore(text[start:end]))
+                    last = end
+        parts.append(text[last:])
+        return "".join(parts)
+
+
+def _same_case(word, form):
+    if word[:1].isupper():
+        return form[:1].upper() + form[1:]
+    return form
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Build diacritic restoration index')
+    parser.add_argument(
+        'words_forms',
+        help='words_forms.txt or .ndjson written by export_to_compact '
+             '(both may be compressed)')
+    parser.add_argument('out')
+    parser.add_argument('--mapping', default=None)
+    parser.add_argument(
+        '--lang', default='isv_etm', choices=sorted(translation_functions))
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.words_forms, args.mapping, args.lang)
+    n_keys, n_forms = build_restoration_index(pairs, args.out)
+    print(f"{n_keys} keys, {n_forms} forms -> {args.out}")
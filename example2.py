@@ -1,10 +1,22 @@
 import pymorphy2
 import argparse
-from constants import VERB_PREFIXES, SIMPLE_DIACR_SUBS, ETM_DIACR_SUBS, DEFAULT_UNITS, BASE_ISV_TOKEN_REGEX
+from os.path import isfile
+from time import perf_counter
+from constants import SIMPLE_DIACR_SUBS, ETM_DIACR_SUBS, DEFAULT_UNITS
+from tokenizer import WORD, tokenize
+from diacritics import DiacriticRestorer
+from ngram_model import NgramModel
 import ipymarkup   # pip install ipymarkup
 
 
-def dodavaj_bukvy(word, etm_morph):
+def dodavaj_bukvy(word, etm_morph, restorer=None):
+    """
+    restorer is an optional diacritics.DiacriticRestorer, with it the word
+    is looked up directly instead of parsed with char_substitutes
+    """
+    if restorer is not None:
+        corrected = restorer.candidates(word)
+        return "/".join(corrected) if corrected else word + "/?"
     corrected = [f.word for f in etm_morph.parse(word)]
     if len(set(corrected)) == 1:
         return corrected[0]
@@ -13,42 +25,137 @@ def dodavaj_bukvy(word, etm_morph):
     return "/".join(set(corrected))
 
 
-def spellcheck_text(paragraph, std_morph):
-    delimiters = BASE_ISV_TOKEN_REGEX.finditer(paragraph)
+def spellcheck_text(paragraph, std_morph, suggestions=None, stats=None,
+                    max_words=None, deadline=None, tokens=None):
+    """
+    tokens are tokenizer.tokenize(paragraph), if the caller has them already.
+    suggestions is an optional suggestions.SuggestionIndex, it is asked
+    for unknown words pymorphy2 has no correction for (typos, several
+    missing diacritics on one letter).
+    stats is an optional dict; once the generator is exhausted, seconds
+    spent in "tokenize", "parse" and "suggest" and numbers of "words",
+    "unknown" and "corrected" words are added to it, and "checked" is
+    set to the length of the checked part of paragraph. suggestions
+    count their cache hits and misses in it too.
+    Checking stops before the word after max_words, or once
+    time.perf_counter() passes deadline, so only a prefix is checked
+    """
+    started = perf_counter()
+    if tokens is None:
+        tokens = tokenize(paragraph)
+    tokenize_time = perf_counter() - started
+    parse_time = suggest_time = 0.0
+    n_words = n_unknown = 0
+
     proposed_corrections = []
-    for delim in delimiters:
-        token = delim.group().lower()
-        is_word = any(c.isalpha() for c in delim.group())
+    checked = len(paragraph)
+    for start, end, kind in tokens:
+        if kind == WORD and (
+                (max_words is not None and n_words >= max_words)
+                or (deadline is not None and perf_counter() > deadline)):
+            checked = start
+            break
+        token = paragraph[start:end].lower()
+        is_word = kind == WORD
         is_known = None
         corrected = None
         confident_correction = None
 
         if is_word:
+            n_words += 1
+            started = perf_counter()
             is_known = True
             candidates = set([f.word for f in std_morph.parse(token)])
             if candidates != {token} or not std_morph.word_is_known(token):
                 is_known = False
+                n_unknown += 1
             if len(set(candidates)) >= 1:
                 corrected = "/".join(set(candidates))
+            parse_time += perf_counter() - started
+            if not is_known and corrected in (None, token) and suggestions is not None:
+                started = perf_counter()
+                suggested = suggestions.suggest(token, stats=stats)
+                if suggested:
+                    # only the closest ones, e.g. no typo fixes next to
+                    # a form that differs just in diacritics
+                    best = suggested[0][1]
+                    corrected = "/".join(
+                        form for form, distance in suggested if distance == best)
+                suggest_time += perf_counter() - started
 
         markup = "" if is_known or not is_word else "^" * len(token)
         if corrected and corrected != token:
             proposed_corrections.append(corrected)
             confident_correction = corrected
             markup = str(len(proposed_corrections))
-        span_data = (delim.start(), delim.end(), markup)
+        span_data = (start, end, markup)
         yield span_data, confident_correction
 
-
-def perform_spellcheck(text, std_morph):
-    data = list(spellcheck_text(text, std_morph))
+    if stats is not None:
+        for key, value in [("tokenize", tokenize_time), ("parse", parse_time),
+                           ("suggest", suggest_time), ("words", n_words),
+                           ("unknown", n_unknown),
+                           ("corrected", len(proposed_corrections))]:
+            stats[key] = stats.get(key, 0) + value
+        stats["checked"] = checked
+
+
+def rank_corrections(paragraph, tokens, data, model):
+    """
+    Puts the candidate model (ngram_model.NgramModel) prefers in the
+    context of the paragraph first in every "a/b/c" correction.
+    tokens are the ones data was made from. Returns new data and
+    the score of the first candidate for every entry (None where
+    there is no correction)
+    """
+    lattice = []
+    corrected_at = {}
+    for n, ((start, end, kind), (span_data, correction)) in enumerate(zip(tokens, data)):
+        if kind != WORD:
+            continue
+        if correction:
+            corrected_at[len(lattice)] = n
+            lattice.append(correction.split("/"))
+        else:
+            lattice.append([paragraph[start:end].lower()])
+
+    data = list(data)
+    scores = [None] * len(data)
+    for i, (best, score) in enumerate(model.decode(lattice)):
+        if i in corrected_at:
+            n = corrected_at[i]
+            rest = [c for c in lattice[i] if c != best]
+            data[n] = (data[n][0], "/".join([best] + rest))
+            scores[n] = score
+    return data, scores
+
+
+def perform_spellcheck(text, std_morph, suggestions=None, model=None, stats=None,
+                       max_words=None, deadline=None):
+    """
+    Returns text, spans, corrections and their scores: with model the
+    probability of the first candidate of every correction, else None
+    """
+    started = perf_counter()
+    tokens = tokenize(text)
+    if stats is not None:
+        stats["tokenize"] = stats.get("tokenize", 0) + perf_counter() - started
+    data = list(spellcheck_text(
+        text, std_morph, suggestions, stats, max_words, deadline, tokens))
+    scores = [None] * len(data)
+    if model is not None:
+        started = perf_counter()
+        data, scores = rank_corrections(text, tokens, data, model)
+        if stats is not None:
+            stats["rank"] = stats.get("rank", 0) + perf_counter() - started
     spans = [entry[0] for entry in data if entry[0][2]]
     proposed_corrections = [entry[1] for entry in data if entry[1]]
-    return text, spans, proposed_corrections
+    correction_scores = [score for entry, score in zip(data, scores) if entry[1]]
+    return text, spans, proposed_corrections, correction_scores
 
 
 def print_spellcheck(text, std_morph):
-    text, spans, proposed_corrections = perform_spellcheck(text, std_morph)
+    text, spans, proposed_corrections, _ = perform_spellcheck(text, std_morph)
     print("let text = ", text)
     print("")
     print("let spans = ", [list(entry) for entry in spans])
@@ -79,6 +186,17 @@ if __name__ == "__main__":
         char_substitutes=ETM_DIACR_SUBS
     )
 
+    # built by diacritics.py with --lang isv_lat/isv_etm, optional
+    std_restorer = etm_restorer = None
+    if isfile(path+"restore_isv_lat.bin"):
+        std_restorer = DiacriticRestorer(path+"restore_isv_lat.bin")
+    if isfile(path+"restore_isv_etm.bin"):
+        etm_restorer = DiacriticRestorer(path+"restore_isv_etm.bin")
+    # built by ngram_model.py from an etymological corpus, optional
+    etm_model = None
+    if isfile(path+"ngram_isv_etm.bin"):
+        etm_model = NgramModel(path+"ngram_isv_etm.bin")
+
     text = "ja funguju i razuměju avtododavanje etymologičnyh bukv"
 
     text_smpl = "po mojemu mnenju hcu preporuciti gledi pese troicky most v gradu celjabinsku zeđam foto za zenu"
@@ -89,20 +207,24 @@ if __name__ == "__main__":
 
     print()
     for word in text.split(" "):
-        print(dodavaj_bukvy(word, etm_morph), end=" ")
+        print(dodavaj_bukvy(word, etm_morph, etm_restorer), end=" ")
     print()
     print()
 
     print(text_smpl)
-    fixed_text = " ".join(dodavaj_bukvy(word, std_morph) for word in text_smpl.split(" "))
+    fixed_text = " ".join(dodavaj_bukvy(word, std_morph, std_restorer) for word in text_smpl.split(" "))
     print("=== ADD SIMPLE DIACRITICS ===")
     print(fixed_text)
     print()
     print(text_stnd)
     print("=== ADD ETYMOLOGICAL DIACRITICS ===")
-    fixed_text = " ".join(dodavaj_bukvy(word, etm_morph) for word in text_stnd.split(" "))
+    fixed_text = " ".join(dodavaj_bukvy(word, etm_morph, etm_restorer) for word in text_stnd.split(" "))
     print(fixed_text)
     print()
+    if etm_restorer is not None and etm_model is not None:
+        print("=== ADD ETYMOLOGICAL DIACRITICS IN CONTEXT ===")
+        print(etm_restorer.restore_text(text_stnd, etm_model))
+        print()
     print("=== GROUND TRUTH ===")
     print(text_full)
     print()
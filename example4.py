@@ -7,7 +7,8 @@ from collections import Counter
 import pymorphy2
 import fitz  # pip install pymupdf
 
-from constants import VERB_PREFIXES, SIMPLE_DIACR_SUBS, ETM_DIACR_SUBS, DEFAULT_UNITS, BASE_ISV_TOKEN_REGEX
+from constants import VERB_PREFIXES, SIMPLE_DIACR_SUBS, ETM_DIACR_SUBS, DEFAULT_UNITS
+from tokenizer import words
 
 def download_file(url):
     local_filename = url.split('/')[-1]
@@ -18,11 +19,7 @@ def download_file(url):
     return local_filename
 
 def iterate_over_text(paragraph):
-    delimiters = BASE_ISV_TOKEN_REGEX.finditer(paragraph)
-    for delim in delimiters:
-        if any(c.isalpha() for c in delim.group()):
-            token = delim.group()
-            yield token
+    yield from words(paragraph)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
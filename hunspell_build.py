@@ -0,0 +1,129 @@
+import os
+import hashlib
+import logging
+import argparse
+from os.path import join, isfile
+
+from convert import Dictionary, lat2std
+
+FLAGS_DICT = {
+    "STEM": "S",
+    "VERB": "V",
+    "VERB2STEM": "Z",
+    "EXCEPTION_STEM": "E",
+    "VERB_ASPECT": "A",
+    "VP": "P",
+}
+
+# bump when output format changes, so old builds are not reused
+BUILD_VERSION = "1"
+
+
+def preprocess_file(fname):
+    """
+    Reads .preaff/.predic file: strips comments and empty lines and fills
+    in flag names ("{STEM}" -> "S")
+    """
+    lines = []
+    with open(fname, "r", encoding="utf8") as f:
+        for line in f:
+            data, _, comment = line.partition("#")
+            if data.strip():
+                lines.append(data.strip().format(**FLAGS_DICT))
+    return lines
+
+
+def hash_inputs(fnames):
+    digest = hashlib.sha256(BUILD_VERSION.encode())
+    digest.update(repr(sorted(FLAGS_DICT.items())).encode())
+    for fname in fnames:
+        digest.update(os.path.basename(fname).encode("utf8") + b"\0")
+        with open(fname, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dictionary_stems(dictionary):
+    """
+    Lemmas of convert.Dictionary in the same (standard latin) orthography
+    as the normalized text fed to Hunspell. Lemmas whose paradigm fails to
+    expand are left out, as in eager loading
+    """
+    stems = []
+    known = set()
+    for lemma in dictionary.iter_lemmas():
+        stem = lat2std(lemma.lemma_form.form.lower())
+        if stem and " " not in stem and stem not in known:
+            known.add(stem)
+            stems.append(stem)
+    return stems
+
+
+def build_hunspell(out_dir, preaff="hunspell.preaff", predic="hunspell.predic",
+                   words_forms=None, mapping=None, dictionary=None,
+                   name="ISV", force=False):
+    """
+    Generates <name>.aff and <name>.dic in out_dir.
+    Stems listed in predic keep their flags; with words_forms every lemma of
+    the dictionary that is not listed there is added as a bare stem.
+    Returns False if the outputs are already built from the same inputs.
+    """
+    aff_fname = join(out_dir, f"{name}.aff")
+    dic_fname = join(out_dir, f"{name}.dic")
+    stamp_fname = join(out_dir, f"{name}.sha256")
+
+    inputs = [preaff, predic] + ([words_forms] if words_forms else [])
+    digest = hash_inputs(inputs)
+    if not force and isfile(aff_fname) and isfile(dic_fname) and isfile(stamp_fname):
+        with open(stamp_fname, "r") as f:
+            if f.read().strip() == digest:
+                logging.debug("hunspell files are up to date: %s" % digest)
+                return False
+
+    aff_lines = preprocess_file(preaff)
+    dic_lines = preprocess_file(predic)
+    # first line of .dic is the number of entries, it is recomputed below
+    if dic_lines and dic_lines[0].isdigit():
+        dic_lines = dic_lines[1:]
+
+    if words_forms:
+        if dictionary is None:
+            # paradigms are expanded while iterating, to drop broken ones
+            dictionary = Dictionary(words_forms, mapping, lazy=True)
+        listed = {line.partition("/")[0] for line in dic_lines}
+        dic_lines += [
+            stem for stem in dictionary_stems(dictionary) if stem not in listed
+        ]
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(aff_fname, "w", encoding="utf8") as f_out:
+        for data in aff_lines:
+            f_out.write(data + "\n")
+    with open(dic_fname, "w", encoding="utf8") as f_out:
+        f_out.write(f"{len(dic_lines)}\n")
+        for data in dic_lines:
+            f_out.write(data + "\n")
+    # stamp goes last: interrupted build is never treated as up to date
+    with open(stamp_fname, "w") as f_out:
+        f_out.write(digest + "\n")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Generate Hunspell affix and dictionary files')
+    parser.add_argument('out_dir', nargs='?', default='./hunspell_data')
+    parser.add_argument('--preaff', default='hunspell.preaff')
+    parser.add_argument('--predic', default='hunspell.predic')
+    parser.add_argument(
+        '--words-forms', default=None,
+        help='add lemmas of this words_forms.txt as stems')
+    parser.add_argument('--mapping', default=None)
+    parser.add_argument('--force', action='store_true')
+    args = parser.parse_args()
+
+    rebuilt = build_hunspell(
+        args.out_dir, preaff=args.preaff, predic=args.predic,
+        words_forms=args.words_forms, mapping=args.mapping, force=args.force)
+    print("rebuilt" if rebuilt else "up to date")
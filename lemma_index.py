@@ -0,0 +1,260 @@
+import sys
+import mmap
+import struct
+import argparse
+from array import array
+from os.path import splitext
+
+from compressed_io import compression_of
+from convert import Dictionary, compact_header, iterate_compact, translation_functions
+
+# On-disk layout (all integers are little-endian uint32):
+#   header: magic, number of keys, number of lemmas, number of values,
+#           param (what the index was built with, e.g. max_distance of
+#           suggestion indexes; 0 for plain lemma indexes)
+#   key offsets    (n_keys + 1)   -> positions in the key blob
+#   value offsets  (n_keys + 1)   -> positions in the values array
+#   values         (n_values)     -> lemma ids
+#   lemma offsets  (n_lemmas + 1) -> positions in the lemma blob
+#   key blob, lemma blob          -> utf-8 strings, keys sorted bytewise
+#
+# Bytewise order of utf-8 is the same as code point order, so lookups can
+# binary search the raw bytes without decoding anything.
+MAGIC = b"ISVLIDX2"
+HEADER = struct.Struct("<8sIIII")
+
+
+def iterate_form_lemma_pairs(dictionary, lang="isv_lat"):
+    translate_func = translation_functions[lang]
+    for lemma in dictionary.iter_lemmas():
+        lemma_text = translate_func(lemma.lemma_form.form.lower())
+        for forms in lemma.forms.values():
+            for form in forms:
+                yield translate_func(form.form.lower()), lemma_text
+
+
+def iterate_compact_pairs(fname):
+    """
+    Same pairs from the output of Dictionary.export_to_compact, already
+    in the orthography it was exported in
+    """
+    for record in iterate_compact(fname):
+        yield record["lemma"], record["lemma"]
+        for form, tags in record["forms"]:
+            yield form, record["lemma"]
+
+
+def is_compact(fname):
+    """
+    True for .ndjson files written by export_to_compact, also compressed
+    ones (.ndjson.gz, ...)
+    """
+    if compression_of(fname) is not None:
+        fname = splitext(fname)[0]
+    return splitext(fname)[1].lower() == ".ndjson"
+
+
+def load_pairs(fname, mapping=None, lang="isv_lat", lazy=True):
+    """
+    (surface form, lemma) pairs in lang orthography, from words_forms.txt
+    or from export_to_compact output, which has to be exported in lang
+    """
+    if is_compact(fname):
+        exported = compact_header(fname).get("lang")
+        if exported != lang:
+            raise ValueError("%s is exported as %s, not %s" % (fname, exported, lang))
+        return iterate_compact_pairs(fname)
+    d = Dictionary(fname, mapping=mapping, lazy=lazy)
+    return iterate_form_lemma_pairs(d, lang=lang)
+
+
+def _as_uint32(values):
+    arr = array("I", values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def build_index(pairs, fname, param=0):
+    """
+    Takes iterable of (surface form, lemma) pairs and writes them
+    as a sorted array with offsets that can be memory-mapped later;
+    param is stored in the header and read back as LemmaIndex.param
+    """
+    lemma_ids = {}
+    form_lemmas = {}
+    for form, lemma in pairs:
+        if not form:
+            continue
+        lemma_id = lemma_ids.setdefault(lemma, len(lemma_ids))
+        known = form_lemmas.setdefault(form.encode("utf8"), [])
+        if lemma_id not in known:
+            known.append(lemma_id)
+
+    keys = sorted(form_lemmas)
+    key_offsets = [0]
+    value_offsets = [0]
+    values = []
+    for key in keys:
+        key_offsets.append(key_offsets[-1] + len(key))
+        values.extend(form_lemmas[key])
+        value_offsets.append(len(values))
+
+    lemma_blobs = [lemma.encode("utf8") for lemma in lemma_ids]
+    lemma_offsets = [0]
+    for blob in lemma_blobs:
+        lemma_offsets.append(lemma_offsets[-1] + len(blob))
+
+    with open(fname, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(keys), len(lemma_blobs), len(values), param))
+        f.write(_as_uint32(key_offsets))
+        f.write(_as_uint32(value_offsets))
+        f.write(_as_uint32(values))
+        f.write(_as_uint32(lemma_offsets))
+        f.write(b"".join(keys))
+        f.write(b"".join(lemma_blobs))
+
+    return len(keys), len(lemma_blobs)
+
+
+class MappedSortedKeys(object):
+    """
+    Base of the read-only memory-mapped files with sorted utf-8 keys
+    (LemmaIndex, ngram_model.NgramModel): keys are found by binary search
+    over the raw bytes. Subclasses read their header after _open and set
+    n_keys, _key_offsets and _keys_start.
+    """
+    def _open(self, fname):
+        self.fname = fname
+        with open(fname, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _uint32_section(self, pos, length):
+        end = pos + 4 * length
+        if sys.byteorder == "big":
+            section = array("I", self._mmap[pos:end])
+            section.byteswap()
+        else:
+            section = memoryview(self._mmap)[pos:end].cast("I")
+        return section, end
+
+    def __len__(self):
+        return self.n_keys
+
+    def _key(self, i):
+        start = self._keys_start
+        return self._mmap[start + self._key_offsets[i]:
+                          start + self._key_offsets[i + 1]]
+
+    def _bisect(self, key):
+        lo, hi = 0, self.n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, key):
+        i = self._bisect(key)
+        if i < self.n_keys and self._key(i) == key:
+            return i
+        return None
+
+
+class LemmaIndex(MappedSortedKeys):
+    """
+    Read-only surface form -> lemmas index.
+    The file is memory-mapped, so every process that opens the same index
+    shares one copy of it in the page cache.
+    """
+    def __init__(self, fname):
+        self._open(fname)
+
+        magic, self.n_keys, self.n_lemmas, n_values, self.param = HEADER.unpack_from(
+            self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a lemma index" % fname)
+
+        pos = HEADER.size
+        self._key_offsets, pos = self._uint32_section(pos, self.n_keys + 1)
+        self._value_offsets, pos = self._uint32_section(pos, self.n_keys + 1)
+        self._values, pos = self._uint32_section(pos, n_values)
+        self._lemma_offsets, pos = self._uint32_section(pos, self.n_lemmas + 1)
+
+        self._keys_start = pos
+        self._lemmas_start = pos + self._key_offsets[self.n_keys]
+        self._lemma_cache = {}
+
+    def __contains__(self, form):
+        return self._find(form.encode("utf8")) is not None
+
+    def close(self):
+        self._key_offsets = self._value_offsets = None
+        self._values = self._lemma_offsets = None
+        self._mmap.close()
+
+    def _lemma(self, lemma_id):
+        lemma = self._lemma_cache.get(lemma_id)
+        if lemma is None:
+            start = self._lemmas_start
+            lemma = self._mmap[start + self._lemma_offsets[lemma_id]:
+                               start + self._lemma_offsets[lemma_id + 1]
+                               ].decode("utf8")
+            self._lemma_cache[lemma_id] = lemma
+        return lemma
+
+    def _lemmas_at(self, i):
+        return [self._lemma(self._values[j]) for j in
+                range(self._value_offsets[i], self._value_offsets[i + 1])]
+
+    def lookup(self, form):
+        """
+        Returns list of lemmas for the exact surface form (empty if unknown)
+        """
+        i = self._find(form.encode("utf8"))
+        return [] if i is None else self._lemmas_at(i)
+
+    def lookup_many(self, forms):
+        """
+        Batch version of lookup: each distinct form is searched only once
+        """
+        found = {}
+        for form in forms:
+            if form not in found:
+                found[form] = self.lookup(form)
+        return [found[form] for form in forms]
+
+    def lookup_prefix(self, prefix, limit=None):
+        """
+        Yields (form, lemmas) for every indexed form starting with prefix
+        """
+        key = prefix.encode("utf8")
+        i = self._bisect(key)
+        count = 0
+        while i < self.n_keys and (limit is None or count < limit):
+            current = self._key(i)
+            if not current.startswith(key):
+                break
+            yield current.decode("utf8"), self._lemmas_at(i)
+            i += 1
+            count += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Build surface form -> lemma index')
+    parser.add_argument(
+        'words_forms',
+        help='words_forms.txt or .ndjson written by export_to_compact '
+             '(both may be compressed)')
+    parser.add_argument('out')
+    parser.add_argument('--mapping', default=None)
+    parser.add_argument(
+        '--lang', default='isv_lat', choices=sorted(translation_functions))
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.words_forms, args.mapping, args.lang, lazy=False)
+    n_keys, n_lemmas = build_index(pairs, args.out)
+    print(f"{n_keys} forms, {n_lemmas} lemmas -> {args.out}")
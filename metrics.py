@@ -0,0 +1,144 @@
+import multiprocessing
+
+# Prometheus text exposition format version served by render()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Registry(object):
+    """
+    Counters, gauges and histograms whose values live in one shared
+    memory array. Create all metrics before the server forks its workers,
+    then every worker updates and renders the same numbers.
+    Label values have to be known up front, each metric has at most
+    one label.
+    """
+    def __init__(self):
+        self.metrics = []
+        self.size = 0
+        self.values = None
+        self.lock = multiprocessing.Lock()
+
+    def _reserve(self, n):
+        if self.values is not None:
+            raise RuntimeError("metrics can not be added after the first update")
+        start = self.size
+        self.size += n
+        return start
+
+    def allocate(self):
+        """
+        Creates the shared array; call it before forking
+        """
+        if self.values is None:
+            self.values = multiprocessing.RawArray("d", self.size)
+        return self.values
+
+    def counter(self, name, help, label=None, label_values=()):
+        metric = Counter(self, name, help, label, label_values)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, label=None, label_values=()):
+        metric = Gauge(self, name, help, label, label_values)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, label=None, label_values=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(self, name, help, label, label_values, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        values = self.allocate()
+        with self.lock:
+            snapshot = list(values)
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render(snapshot))
+        return "\n".join(lines) + "\n"
+
+
+class Counter(object):
+    type = "counter"
+    slots_per_series = 1
+
+    def __init__(self, registry, name, help, label=None, label_values=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label = label
+        self.label_values = list(label_values) if label else [None]
+        self.start = registry._reserve(self.slots_per_series * len(self.label_values))
+
+    def _offset(self, label_value):
+        return self.start + self.slots_per_series * self.label_values.index(label_value)
+
+    def _series_labels(self, label_value):
+        return [(self.label, label_value)] if self.label else []
+
+    def inc(self, amount=1, label_value=None):
+        values = self.registry.allocate()
+        i = self._offset(label_value)
+        with self.registry.lock:
+            values[i] += amount
+
+    def render(self, snapshot):
+        for label_value in self.label_values:
+            value = snapshot[self._offset(label_value)]
+            yield f"{self.name}{_labels(self._series_labels(label_value))} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount=1, label_value=None):
+        self.inc(-amount, label_value)
+
+
+class Histogram(Counter):
+    type = "histogram"
+
+    def __init__(self, registry, name, help, label=None, label_values=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = sorted(buckets) + [float("inf")]
+        # one slot per bucket, then sum and count
+        self.slots_per_series = len(self.buckets) + 2
+        super().__init__(registry, name, help, label, label_values)
+
+    def observe(self, value, label_value=None):
+        values = self.registry.allocate()
+        i = self._offset(label_value)
+        bucket = next(n for n, bound in enumerate(self.buckets) if value <= bound)
+        with self.registry.lock:
+            values[i + bucket] += 1
+            values[i + len(self.buckets)] += value
+            values[i + len(self.buckets) + 1] += 1
+
+    def render(self, snapshot):
+        for label_value in self.label_values:
+            i = self._offset(label_value)
+            labels = self._series_labels(label_value)
+            cumulative = 0
+            for n, bound in enumerate(self.buckets):
+                cumulative += snapshot[i + n]
+                bucket_labels = _labels(labels + [("le", _format_value(float(bound)))])
+                yield f"{self.name}_bucket{bucket_labels} {_format_value(cumulative)}"
+            yield f"{self.name}_sum{_labels(labels)} {_format_value(snapshot[i + len(self.buckets)])}"
+            yield f"{self.name}_count{_labels(labels)} {_format_value(snapshot[i + len(self.buckets) + 1])}"
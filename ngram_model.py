@@ -0,0 +1,209 @@
+import math
+import struct
+import argparse
+from collections import Counter
+
+from compressed_io import open_compressed
+from convert import translation_functions
+from lemma_index import MappedSortedKeys, _as_uint32
+from tokenizer import words
+
+# On-disk layout (little-endian):
+#   header: magic, number of keys, number of distinct words (uint32),
+#           number of word tokens (uint64)
+#   key offsets (n_keys + 1) uint32 -> positions in the key blob
+#   counts      (n_keys)     uint32
+#   key blob                        -> utf-8, sorted bytewise
+#
+# Keys are single words and "previous word" + " " + "word" for bigrams,
+# tokens never contain whitespace so the two can not collide.
+MAGIC = b"ISVNGRM1"
+HEADER = struct.Struct("<8sIIQ")
+
+# marks the start of a paragraph, tokens never contain it
+START = "\0"
+
+# share of the bigram estimate, the rest is add-one smoothed unigram
+BIGRAM_WEIGHT = 0.7
+
+# counts for this many distinct keys are kept in memory
+COUNT_CACHE_SIZE = 500000
+
+
+def count_ngrams(paragraphs, translate_func=None):
+    """
+    Unigram and bigram counts of lowercased word tokens,
+    START counts paragraphs
+    """
+    counts = Counter()
+    for paragraph in paragraphs:
+        if translate_func is not None:
+            paragraph = translate_func(paragraph)
+        counts[START] += 1
+        previous = START
+        for word in words(paragraph.lower()):
+            counts[word] += 1
+            counts[previous + " " + word] += 1
+            previous = word
+    return counts
+
+
+def iterate_paragraphs(fnames):
+    for fname in fnames:
+        with open_compressed(fname, "rt") as f:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def build_count_table(counts, fname, min_count=1):
+    """
+    Writes counts as a sorted array that NgramModel memory-maps;
+    bigrams seen less than min_count times are left out
+    """
+    n_words = 0
+    n_tokens = 0
+    table = {}
+    for key, count in counts.items():
+        if " " in key:
+            if count < min_count:
+                continue
+        elif key != START:
+            n_words += 1
+            n_tokens += count
+        table[key.encode("utf8")] = min(count, 0xFFFFFFFF)
+
+    keys = sorted(table)
+    key_offsets = [0]
+    for key in keys:
+        key_offsets.append(key_offsets[-1] + len(key))
+
+    with open(fname, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(keys), n_words, n_tokens))
+        f.write(_as_uint32(key_offsets))
+        f.write(_as_uint32(table[key] for key in keys))
+        f.write(b"".join(keys))
+
+    return len(keys), n_tokens
+
+
+class NgramModel(MappedSortedKeys):
+    """
+    Bigram model over word forms for choosing between candidates
+    (restored diacritics, spelling corrections) by their neighbours.
+    The count table is memory-mapped and shared between processes.
+    """
+    def __init__(self, fname):
+        self._open(fname)
+
+        magic, self.n_keys, self.n_words, self.n_tokens = HEADER.unpack_from(
+            self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not an n-gram count table" % fname)
+
+        pos = HEADER.size
+        self._key_offsets, pos = self._uint32_section(pos, self.n_keys + 1)
+        self._counts, pos = self._uint32_section(pos, self.n_keys)
+        self._keys_start = pos
+        self._cache = {}
+
+    def close(self):
+        self._key_offsets = self._counts = None
+        self._mmap.close()
+
+    def count(self, key):
+        found = self._cache.get(key)
+        if found is None:
+            if len(self._cache) >= COUNT_CACHE_SIZE:
+                self._cache.clear()
+            i = self._find(key.encode("utf8"))
+            found = self._cache[key] = 0 if i is None else self._counts[i]
+        return found
+
+    def logprob(self, previous, word):
+        """
+        log P(word | previous), bigram interpolated with add-one unigram
+        """
+        unigram = (self.count(word) + 1) / (self.n_tokens + self.n_words + 1)
+        previous_count = self.count(previous)
+        bigram = 0.0
+        if previous_count:
+            bigram = self.count(previous + " " + word) / previous_count
+        return math.log(BIGRAM_WEIGHT * bigram + (1 - BIGRAM_WEIGHT) * unigram)
+
+    def decode(self, lattice):
+        """
+        lattice is a list of candidate lists, one per word of a sentence.
+        Returns [(best candidate, score), ...] for the most probable
+        sequence (Viterbi); score is the share of probability the chosen
+        candidate has among the others given its chosen neighbours
+        """
+        if not lattice:
+            return []
+        lattice = [list(dict.fromkeys(candidates)) for candidates in lattice]
+
+        # best[i][c] = (log probability of the best path ending in c, previous)
+        best = [{c: (self.logprob(START, c), None) for c in lattice[0]}]
+        for candidates in lattice[1:]:
+            column = {}
+            for c in candidates:
+                column[c] = max(
+                    (score + self.logprob(p, c), p)
+                    for p, (score, _) in best[-1].items())
+            best.append(column)
+
+        path = [max(best[-1], key=lambda c: best[-1][c][0])]
+        for column in reversed(best[1:]):
+            path.append(column[path[-1]][1])
+        path.reverse()
+
+        result = []
+        for i, candidates in enumerate(lattice):
+            if len(candidates) == 1:
+                result.append((path[i], 1.0))
+                continue
+            previous = path[i - 1] if i else START
+            scores = {}
+            for c in candidates:
+                scores[c] = self.logprob(previous, c)
+                if i + 1 < len(path):
+                    scores[c] += self.logprob(c, path[i + 1])
+            top = max(scores.values())
+            total = sum(math.exp(s - top) for s in scores.values())
+            result.append((path[i], math.exp(scores[path[i]] - top) / total))
+        return result
+
+    def decode_many(self, lattices):
+        return [self.decode(lattice) for lattice in lattices]
+
+    def rank(self, candidates, previous=START, following=None):
+        """
+        candidates for one word ordered by probability between
+        previous and following words
+        """
+        def score(c):
+            s = self.logprob(previous, c)
+            if following is not None:
+                s += self.logprob(c, following)
+            return s
+        return sorted(dict.fromkeys(candidates), key=score, reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Count word bigrams in corpora for NgramModel')
+    parser.add_argument(
+        'corpus', nargs='+',
+        help='text files, one paragraph per line (may be compressed)')
+    parser.add_argument('out')
+    parser.add_argument(
+        '--lang', default=None, choices=sorted(translation_functions),
+        help='transliterate the corpus first, must match the orthography '
+             'of the candidates the model will rank')
+    parser.add_argument('--min-count', type=int, default=1)
+    args = parser.parse_args()
+
+    translate_func = translation_functions[args.lang] if args.lang else None
+    counts = count_ngrams(iterate_paragraphs(args.corpus), translate_func)
+    n_keys, n_tokens = build_count_table(counts, args.out, args.min_count)
+    print(f"{n_keys} keys, {n_tokens} tokens -> {args.out}")
@@ -0,0 +1,81 @@
+import re
+import unicodedata
+from string import whitespace
+
+# Shared version of make_string_standard from the chat log scripts.
+# Every per-character step after NFKD (filtering, đ/љ/њ/я/ю/ё rewrites and
+# cyrillic -> latin) is folded into one translate table, and plain ASCII
+# messages skip unicode normalization altogether.
+
+diacr_letters = "žčšěйćżęų"
+plain_letters = "жчшєjчжеу"
+
+lat_alphabet = "abcčdeěfghijjklmnoprsštuvyzž"
+cyr_alphabet = "абцчдеєфгхийьклмнопрсштувызж"
+
+save_diacrits = str.maketrans(diacr_letters, plain_letters)
+cyr2lat = str.maketrans(cyr_alphabet, lat_alphabet)
+
+MULTIWORD_REWRITES = {
+    "đ": "dž",
+    # Serbian and Macedonian
+    "љ": "ль", "њ": "нь",
+    # Russian
+    "я": "йа", "ю": "йу", "ё": "йо",
+}
+
+repeated_j = re.compile(r'j+')
+
+
+class _StandardTable(dict):
+    """
+    Lazily filled translate table: drops everything that is not a letter or
+    whitespace and applies the cyrillic -> latin rewrites in a single pass
+    """
+    def __missing__(self, code):
+        char = chr(code)
+        if char in whitespace or char.isalpha():
+            value = MULTIWORD_REWRITES.get(char, char).translate(cyr2lat)
+        else:
+            value = None
+        self[code] = value
+        return value
+
+
+standard_table = _StandardTable()
+ascii_table = {
+    code: None for code in range(128)
+    if not (chr(code) in whitespace or chr(code).isalpha())
+}
+ascii_table[ord("\n")] = " "
+
+
+def make_string_standard(thestring):
+    if thestring.isascii():
+        filtered = thestring.lower().translate(ascii_table)
+    else:
+        # "e^" -> "ê"
+        # 'z\u030C\u030C\u030C' -> 'ž\u030C\u030C'
+        thestring = unicodedata.normalize(
+            'NFKC',
+            thestring
+        ).lower().replace("\n", " ")
+
+        # remove all diacritics beside haceks/carons
+        thestring = unicodedata.normalize(
+            'NFKD',
+            thestring.translate(save_diacrits)
+        )
+        filtered = thestring.translate(standard_table)
+
+    # repeated 'j's
+    if "jj" in filtered:
+        return repeated_j.sub('j', filtered)
+    return filtered
+
+
+def make_strings_standard(strings):
+    """
+    Batch version of make_string_standard, keeps the order of input
+    """
+    return [make_string_standard(s) for s in strings]
@@ -5,6 +5,7 @@ import logging
 from collections import Counter
 
 from convert import Dictionary, doubleform_signal
+from hunspell_build import build_hunspell
 from pathlib import Path
 
 
@@ -20,6 +21,7 @@ DEBUG = True
 RUN_EXPORT = False
 RUN_CONVERT = True
 RUN_BUILD_DICTS = True
+RUN_HUNSPELL = False
 
 if RUN_EXPORT:
     subprocess.check_output(
@@ -39,14 +41,24 @@ if DEBUG:
 
 if RUN_CONVERT:
     d = Dictionary(dictionary_path, mapping="mapping_isv.csv")
+    print(d.report.summary())
     for lang in ['isv_cyr', 'isv_lat', 'isv_etm']:
         d.export_to_xml(join(DIR, "pymorphy2-dicts", f"out_{lang}.xml"), lang=lang)
+        # same content, but streamable line by line and much smaller
+        d.export_to_compact(join(DIR, "pymorphy2-dicts", f"out_{lang}.ndjson"), lang=lang)
 
         if DEBUG:
             logging.debug("=" * 50)
             for term, cnt in REPEATED_FORMS.most_common():
                 logging.debug(u"%s: %s" % (term, cnt))
 
+if RUN_HUNSPELL:
+    # skipped when hunspell.preaff/.predic and words_forms.txt are unchanged
+    build_hunspell(
+        "hunspell_data", words_forms=dictionary_path, mapping="mapping_isv.csv",
+        dictionary=d if RUN_CONVERT else None
+    )
+
 if RUN_BUILD_DICTS:
     for lang in ['isv_cyr', 'isv_lat', 'isv_etm']:
         out_dir = join(DIR, "pymorphy2-dicts", f"out_{lang}")
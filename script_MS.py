@@ -1,9 +1,9 @@
-import unicodedata
-from string import whitespace
 from collections import Counter, defaultdict
 
 import js2py
-import re
+
+from normalization import make_string_standard
+from chat_export import iterate_contents
 
 with open("C:/dev/discord/transliterate.js", "r", encoding="utf8") as f:
     js_string = f.read()
@@ -13,46 +13,6 @@ with open("C:/dev/discord/transliterate.js", "r", encoding="utf8") as f:
 
 # last one: lat x to cyr х 
 
-diacr_letters = "žčšěйćżęų" 
-plain_letters = "жчшєjчжеу"
-
-
-lat_alphabet = "abcčdeěfghijjklmnoprsštuvyzž"
-cyr_alphabet = "абцчдеєфгхийьклмнопрсштувызж"
-
-
-save_diacrits = str.maketrans(diacr_letters, plain_letters)
-cyr2lat = str.maketrans(cyr_alphabet, lat_alphabet)
-
-# ољењ трамвай -> 
-# чей шар -> 
-def make_string_standard(thestring):
-
-    # "e^" -> "ê"
-    # 'z\u030C\u030C\u030C' -> 'ž\u030C\u030C'
-    thestring = unicodedata.normalize(
-        'NFKC', 
-        thestring
-    ).lower().replace("\n", " ")
-
-    # remove all diacritics beside haceks/carons
-    thestring = unicodedata.normalize(
-        'NFKD',
-        thestring.translate(save_diacrits)
-    )
-    filtered = "".join(c for c in thestring if c in whitespace or c.isalpha())
-    # cyrillic to latin
-    filtered = filtered.replace(
-        "đ", "dž").replace(
-        # Serbian and Macedonian
-        "љ", "ль").replace("њ", "нь").replace(
-        # Russian
-        "я", "йа").replace("ю", "йу").replace("ё", "йо")
-        
-    filtered = filtered.translate(cyr2lat)
-    
-    # repeated spaces and 'j's
-    return re.sub(r'j+', r'j', filtered)
 
 
 # import re
@@ -90,26 +50,17 @@ print(make_string_standard("ољењ трамвай чей шар своячен
 lem_counter = Counter()
 unk_counter = Counter()
 i = 0
-with open("C:\dev\discord\Medžuslovjanska besěda - Medžuslovjansky - medžuslovjansky [663622843120222229].json", "r") as f:
-    for line in f:
-        if ":" in line:
-            key, _, content = line.strip().partition(":")
-            content = content.strip()[1:-2]
-            if key == '"content"':
-                # print(codecs.decode(content.encode("utf8"))
-                # print(content.encode("utf8").decode("unicode-escape"))
-                
-                # invoke = f'\n\n transliterate("{filtered}", 1, "3", 0, 1)'
-                # ad_hoc_string = js_string + invoke
-                # result = js2py.eval_js(ad_hoc_string)
-                decoded = content.encode("utf8").decode("unicode-escape")
-                result = make_string_standard(decoded)
-                for word in result.split():
-                    if word in word_forms:
-                        selected_form = word_forms[word][0]
-                        lem_counter.update([selected_form])
-                    else: 
-                        unk_counter.update([word])
+for content in iterate_contents("C:\dev\discord\Medžuslovjanska besěda - Medžuslovjansky - medžuslovjansky [663622843120222229].json"):
+    # invoke = f'\n\n transliterate("{filtered}", 1, "3", 0, 1)'
+    # ad_hoc_string = js_string + invoke
+    # result = js2py.eval_js(ad_hoc_string)
+    result = make_string_standard(content)
+    for word in result.split():
+        if word in word_forms:
+            selected_form = word_forms[word][0]
+            lem_counter.update([selected_form])
+        else: 
+            unk_counter.update([word])
 
 print(len(lem_counter))
 print(len(unk_counter))
@@ -1,12 +1,32 @@
+import gc
+import os
+import sys
+import time
+import signal
 import argparse
-from flask import Flask, render_template, request, jsonify
+import multiprocessing
+from os.path import isfile
+from flask import Flask, Response, render_template, request, jsonify
 from example2 import perform_spellcheck, pymorphy2
 from constants import DEFAULT_UNITS, SIMPLE_DIACR_SUBS, ETM_DIACR_SUBS, CYR_LETTER_SUBS
+from suggestions import SuggestionIndex
+from ngram_model import NgramModel
+from metrics import Registry, CONTENT_TYPE
 
 app = Flask(__name__)
 app.config["JSON_AS_ASCII"] = False
 
-path = "C:\\dev\\pymorphy2-dicts\\"
+path = os.environ.get("ISV_DICTS_PATH", "C:\\dev\\pymorphy2-dicts\\")
+
+# /koriguj limits: longer texts are rejected with 413, after MAX_WORDS
+# words or TIME_BUDGET seconds the rest of the text is left unchecked
+MAX_TEXT_LENGTH = int(os.environ.get("ISV_MAX_TEXT_LENGTH", 50000))
+MAX_WORDS = int(os.environ.get("ISV_MAX_WORDS", 5000))
+TIME_BUDGET = float(os.environ.get("ISV_TIME_BUDGET", 1.0))
+# requests spellchecked at once by all workers together, the ones over
+# it get 429 with Retry-After instead of waiting in a queue
+MAX_CONCURRENT = int(os.environ.get("ISV_MAX_CONCURRENT", os.cpu_count() or 1))
+RETRY_AFTER = int(os.environ.get("ISV_RETRY_AFTER", 1))
 
 std_morph = pymorphy2.MorphAnalyzer(
     path+"out_isv_lat",
@@ -27,29 +47,194 @@ cyr_morph = pymorphy2.MorphAnalyzer(
 )
 
 abecedas = {"lat": std_morph, "etm": etm_morph, "cyr": cyr_morph}
-    
+
+# built by suggestions.py with --lang isv_lat/isv_etm/isv_cyr, optional
+suggestion_files = {
+    "lat": path+"suggestions_isv_lat.bin",
+    "etm": path+"suggestions_isv_etm.bin",
+    "cyr": path+"suggestions_isv_cyr.bin",
+}
+suggestion_indexes = {
+    abeceda: SuggestionIndex(fname)
+    for abeceda, fname in suggestion_files.items() if isfile(fname)
+}
+
+# built by ngram_model.py with the matching --lang, optional
+model_files = {
+    "lat": path+"ngram_isv_lat.bin",
+    "etm": path+"ngram_isv_etm.bin",
+    "cyr": path+"ngram_isv_cyr.bin",
+}
+ngram_models = {
+    abeceda: NgramModel(fname)
+    for abeceda, fname in model_files.items() if isfile(fname)
+}
+
+# Shared by all workers, see metrics.Registry; served on /metrics
+registry = Registry()
+request_count = registry.counter(
+    "isv_koriguj_requests_total", "Spellcheck requests.",
+    "abeceda", abecedas)
+request_latency = registry.histogram(
+    "isv_koriguj_latency_seconds", "Spellcheck request latency.",
+    "abeceda", abecedas)
+request_tokens = registry.histogram(
+    "isv_koriguj_words", "Words per spellcheck request.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000))
+stage_seconds = registry.counter(
+    "isv_koriguj_stage_seconds_total", "Time spent in each spellcheck stage.",
+    "stage", ["tokenize", "parse", "suggest", "rank"])
+word_count = registry.counter(
+    "isv_koriguj_words_total", "Checked words by outcome.",
+    "outcome", ["known", "unknown", "corrected"])
+in_flight = registry.gauge(
+    "isv_koriguj_in_flight", "Spellcheck requests being processed.")
+suggestion_cache = registry.counter(
+    "isv_suggestion_cache_total", "Suggestion index cache lookups.",
+    "result", ["hit", "miss"])
+rejected_count = registry.counter(
+    "isv_koriguj_rejected_total", "Spellcheck requests rejected.",
+    "reason", ["too_large", "overloaded"])
+partial_count = registry.counter(
+    "isv_koriguj_partial_total", "Spellcheck requests answered for a prefix of the text.")
+registry.allocate()
+
+# created before fork, so it limits all the workers together
+spellcheck_slots = multiprocessing.BoundedSemaphore(MAX_CONCURRENT)
+
+# Everything above is loaded once, before serve_prefork forks the workers
+# (the indexes are memory-mapped and shared anyway). Moving these objects
+# out of the collector's reach keeps it from writing to their pages in
+# the workers, so they stay shared copy-on-write instead of being copied
+# into every worker.
+gc.freeze()
+
+
 @app.route('/')
 def index():
     return render_template('main.html')
 
 @app.route('/koriguj', methods=['POST'])
 def korigovanje():
-    text = request.json['text'];
-    selected_morph = abecedas[request.json["abeceda"]]
-    text, spans, proposed_corrections = perform_spellcheck(text, selected_morph)
+    started = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    text = data.get('text')
+    abeceda = data.get("abeceda")
+    if not isinstance(text, str) or abeceda not in abecedas:
+        return jsonify({'error': "text and abeceda (%s) are required" % ", ".join(abecedas)}), 400
+    if len(text) > MAX_TEXT_LENGTH:
+        rejected_count.inc(label_value="too_large")
+        return jsonify({'error': f"text is longer than {MAX_TEXT_LENGTH} characters"}), 413
+    if not spellcheck_slots.acquire(block=False):
+        rejected_count.inc(label_value="overloaded")
+        resp = jsonify({'error': "too many requests, try again later"})
+        return resp, 429, {'Retry-After': str(RETRY_AFTER)}
+
+    # nothing between acquire and try, the slot is shared by all workers
+    # and would be lost for good
+    try:
+        in_flight.inc()
+        try:
+            selected_morph = abecedas[abeceda]
+            selected_suggestions = suggestion_indexes.get(abeceda)
+            selected_model = ngram_models.get(abeceda)
+            stats = {}
+            text, spans, proposed_corrections, scores = perform_spellcheck(
+                text, selected_morph, selected_suggestions, selected_model, stats,
+                max_words=MAX_WORDS, deadline=started + TIME_BUDGET)
+        finally:
+            in_flight.dec()
+    finally:
+        spellcheck_slots.release()
+
+    for stage in stage_seconds.label_values:
+        stage_seconds.inc(stats.get(stage, 0), stage)
+    word_count.inc(stats["words"] - stats["unknown"], "known")
+    word_count.inc(stats["unknown"], "unknown")
+    word_count.inc(stats["corrected"], "corrected")
+    request_tokens.observe(stats["words"])
+    suggestion_cache.inc(stats.get("suggest_hits", 0), "hit")
+    suggestion_cache.inc(stats.get("suggest_misses", 0), "miss")
+    complete = stats["checked"] == len(text)
+    if not complete:
+        partial_count.inc()
 
     resp = {
         'text': text,
         'spans': spans,
-        'corrections': proposed_corrections
+        'corrections': proposed_corrections,
+        # probability of the first candidate of each correction, null
+        # without an ngram model
+        'scores': scores,
+        # text[checked:] was not checked, limits of MAX_WORDS/TIME_BUDGET
+        'checked': stats["checked"],
+        'complete': complete,
     }
+    request_count.inc(label_value=abeceda)
+    request_latency.observe(time.perf_counter() - started, abeceda)
     return jsonify(resp)
+
+@app.route('/metrics')
+def metrics():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
  
+def serve_prefork(host, port, workers):
+    """
+    Binds the socket once and forks workers that accept on it; they all
+    share the dictionaries loaded at import. Returns the worker pids
+    """
+    from werkzeug.serving import make_server
+    # threaded, so requests over MAX_CONCURRENT get a quick 429 instead
+    # of waiting in the listen queue behind a long one
+    server = make_server(host, port, app, threaded=True)
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    server.socket.close()
+    return pids
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
            '--port', type=int, default=666,
            help='The port to listen on (defaults to 666).')
+    parser.add_argument(
+           '--workers', type=int, default=1,
+           help='Number of forked worker processes sharing the dictionaries '
+                '(defaults to 1, the debug server).')
+    parser.add_argument(
+           '--memory-report', type=float, default=None, metavar='SECONDS',
+           help='With --workers, print shared/private memory of every '
+                'worker this often.')
     args = parser.parse_args()
-    app.run(host='localhost', port=args.port, debug=True)
+
+    if args.workers == 1:
+        app.run(host='localhost', port=args.port, debug=True)
+    else:
+        pids = serve_prefork('localhost', args.port, args.workers)
+        print(f"master {os.getpid()}, workers {pids}")
+        # stop the workers too when the master is terminated
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            if args.memory_report:
+                from worker_memory import report
+                while True:
+                    time.sleep(args.memory_report)
+                    report(os.getpid())
+            else:
+                for _ in pids:
+                    os.wait()
+        finally:
+            for pid in pids:
+                try:
+                    os.kill(pid, 15)
+                except ProcessLookupError:
+                    pass
 
@@ -1,33 +1,10 @@
 
-from collections import Counter, defaultdict
+from collections import Counter
 
+from translation_store import read_data
 
-translations = defaultdict(dict)
-morphology_src = {}
-
-unknown_ids = []
-
-metadata_arr = []
-
-with open("data.txt", "r", encoding="utf8") as f:
-    content = f.read()
-    metadata_lines, translation_lines, completion_stats = content.split("<>")
-    for line in metadata_lines.splitlines():
-        arr = line.strip().split('\t')
-        if len(arr) == 16:
-            metadata_arr.append(tuple(arr))
-        if len(arr) == 1:
-            unknown_ids.append(arr[0])
-    for line in translation_lines.splitlines():
-        arr = line.strip().split('\t')
-        if arr[0].startswith("id"):
-            continue
-        if len(arr) == 1:
-            unknown_ids.append(arr[0])
-        if len(arr) == 2:
-            lang_id, value = arr
-            word_id, _, lang = lang_id.partition("-")
-            translations[word_id][lang] = value.split("|")
+# for lookups without parsing data.txt every time see translation_store.py
+metadata_arr, translations, unknown_ids = read_data("data.txt")
 
 
 print()
@@ -0,0 +1,172 @@
+import argparse
+from itertools import combinations
+
+from constants import SIMPLE_DIACR_SUBS, CYR_LETTER_SUBS
+from convert import lat2std, translation_functions
+from lemma_index import LemmaIndex, build_index, load_pairs
+
+# Candidates are searched on "flat" words: etymological letters go to
+# the standard ones (lat2std) and the letters that char_substitutes would
+# add back (SIMPLE_DIACR_SUBS, CYR_LETTER_SUBS) to the plain ones.
+# So any number of missing diacritics costs nothing and only real typos
+# count towards the edit distance.
+FLAT_TRANS = str.maketrans({
+    full: plain for plain, full in
+    list(SIMPLE_DIACR_SUBS.items()) + list(CYR_LETTER_SUBS.items())
+})
+
+# suggestions for this many distinct words are kept in memory
+SUGGEST_CACHE_SIZE = 100000
+
+# diacritic differences counted when ordering suggestions, beyond
+# this they all rank the same
+FULL_DISTANCE_SLACK = 3
+
+
+def flatten(word):
+    return lat2std(word.lower()).translate(FLAT_TRANS)
+
+
+def deletes(word, max_distance):
+    """
+    word itself and every string made from it by removing up to
+    max_distance characters
+    """
+    variants = {word}
+    for n in range(1, min(max_distance, len(word)) + 1):
+        for positions in combinations(range(len(word)), n):
+            variants.add("".join(
+                c for i, c in enumerate(word) if i not in positions))
+    return variants
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance (transposition of two neighbouring
+    letters is one edit); anything above limit is returned as limit + 1.
+    Only the diagonal band of width limit is computed.
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous2 = None
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2]
+                    and a[i - 2] == b[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = min(value, over)
+        if min(current) > limit:
+            return over
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def iterate_delete_pairs(forms, max_distance):
+    """
+    (deleted variant of flat form, form) pairs for build_index
+    """
+    for form in forms:
+        for key in deletes(flatten(form), max_distance):
+            yield key, form
+
+
+def build_suggestion_index(pairs, fname, max_distance=1):
+    """
+    pairs are (surface form, lemma) as produced for lemma_index;
+    only distinct surface forms go to the suggestion index
+    """
+    forms = list(dict.fromkeys(form for form, _ in pairs if " " not in form))
+    # kept in the header, so lookups use the distance it was built for
+    return build_index(
+        iterate_delete_pairs(forms, max_distance), fname, param=max_distance)
+
+
+class SuggestionIndex(object):
+    """
+    Symmetric delete index: both dictionary forms and the misspelled word
+    are reduced to their variants with up to max_distance letters removed,
+    a shared variant means the two are close. Lookups are a few binary
+    searches in the memory-mapped file, no scan over the dictionary.
+    """
+    def __init__(self, fname):
+        self.index = LemmaIndex(fname)
+        self.max_distance = self.index.param
+        self._cache = {}
+
+    def close(self):
+        self.index.close()
+
+    def suggest(self, word, limit=5, stats=None):
+        """
+        Returns [(form, distance), ...] of dictionary forms within
+        max_distance edits of word (ignoring diacritics), closest first;
+        among equally close forms the ones that differ less in diacritics
+        go first. Cache "suggest_hits" and "suggest_misses" are counted
+        in the optional stats dict
+        """
+        key = (word, limit)
+        # another thread may clear the cache at any moment, so the result
+        # is never read back from it
+        found = self._cache.get(key)
+        if found is not None:
+            if stats is not None:
+                stats["suggest_hits"] = stats.get("suggest_hits", 0) + 1
+            return found
+        if stats is not None:
+            stats["suggest_misses"] = stats.get("suggest_misses", 0) + 1
+        found = self._suggest(word, limit)
+        if len(self._cache) >= SUGGEST_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = found
+        return found
+
+    def _suggest(self, word, limit):
+        flat = flatten(word)
+        candidates = set()
+        for key in deletes(flat, self.max_distance):
+            candidates.update(self.index.lookup(key))
+
+        ranked = []
+        for candidate in candidates:
+            distance = edit_distance(flat, flatten(candidate), self.max_distance)
+            if distance <= self.max_distance:
+                # only to order forms with the same distance, so the band
+                # can stay narrow
+                full_distance = edit_distance(
+                    word.lower(), candidate, distance + FULL_DISTANCE_SLACK)
+                ranked.append((distance, full_distance, candidate))
+        ranked.sort()
+        return [(candidate, distance) for distance, _, candidate in ranked[:limit]]
+
+    def suggest_many(self, words, limit=5):
+        return [self.suggest(word, limit) for word in words]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Build symmetric delete index for spelling suggestions')
+    parser.add_argument(
+        'words_forms',
+        help='words_forms.txt or .ndjson written by export_to_compact '
+             '(both may be compressed)')
+    parser.add_argument('out')
+    parser.add_argument('--mapping', default=None)
+    parser.add_argument(
+        '--lang', default='isv_lat', choices=sorted(translation_functions))
+    parser.add_argument(
+        '--max-distance', type=int, default=1,
+        help='index size grows quickly with it, 2 is only for small dictionaries')
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.words_forms, args.mapping, args.lang)
+    n_keys, n_forms = build_suggestion_index(pairs, args.out, args.max_distance)
+    print(f"{n_keys} keys, {n_forms} forms -> {args.out}")
@@ -0,0 +1,201 @@
+import random
+import argparse
+
+import ujson
+
+from compressed_io import open_output
+
+# Share of entries per part of speech, roughly as in the real dictionary
+POS_MIX = [
+    ("m.", 22),
+    ("f.", 18),
+    ("n.", 8),
+    ("m./f.", 1),
+    ("adj.", 18),
+    ("v. tr. ipf.", 7),
+    ("v. tr. pf.", 5),
+    ("v. intr. ipf.", 5),
+    ("v. refl. ipf.", 2),
+    ("adv.", 6),
+    ("conj.", 1),
+    ("prep.", 1),
+    ("particle", 1),
+    ("intj.", 1),
+    ("pron.dem.", 1),
+    ("phrase", 1),
+    ("multiword", 2),
+]
+
+ONSETS = [
+    "b", "v", "g", "d", "ž", "z", "k", "l", "m", "n", "p", "r", "s", "t",
+    "h", "c", "č", "š", "dž", "đ", "br", "pr", "tr", "kr", "gl", "sl",
+    "st", "sk", "zv", "dv", "pl", "vl", "ml", "sv", "čr", "šč", "ľ", "ń",
+]
+VOWELS = ["a", "e", "i", "o", "u", "y", "ě", "ę", "ų", "å", "ȯ", "ŕ"]
+CODAS = ["", "", "", "n", "r", "l", "s", "k", "t", "j", "v", "m"]
+FINAL_CONSONANTS = ["d", "t", "k", "n", "l", "r", "s", "v", "b", "m", "h", "ž", "č"]
+
+
+def make_stem(rng, syllables):
+    stem = "".join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS)
+                   for _ in range(syllables - 1))
+    return stem + rng.choice(ONSETS) + rng.choice(VOWELS[:6]) + rng.choice(FINAL_CONSONANTS)
+
+
+def adjective(s):
+    return {
+        "casesSingular": {
+            "nom": [s + "y", s + "o", s + "a"],
+            "acc": [s + "ogo/" + s + "y", s + "o", s + "ų"],
+            "gen": [s + "ogo", s + "oj"],
+            "loc": [s + "om", s + "oj"],
+            "dat": [s + "omu", s + "oj"],
+            "ins": [s + "ym", s + "ojų"],
+        },
+        "casesPlural": {
+            "nom": [s + "i/" + s + "e", s + "e"],
+            "acc": [s + "yh/" + s + "e", s + "e"],
+            "gen": [s + "yh"],
+            "loc": [s + "yh"],
+            "dat": [s + "ym"],
+            "ins": [s + "ymi"],
+        },
+        "comparison": {
+            "positive": [s + "y", s + "o"],
+            "comparative": [s + "ějši", s + "ěje"],
+            "superlative": ["naj" + s + "ějši", "naj" + s + "ěje"],
+        },
+    }
+
+
+def masculine_noun(s):
+    return {
+        "nom": [s, s + "y"], "acc": [s, s + "y"], "gen": [s + "a", s + "ov"],
+        "loc": [s + "u", s + "ah"], "dat": [s + "u", s + "am"],
+        "ins": [s + "om", s + "ami"], "voc": [s + "e", s + "y"],
+    }
+
+
+def feminine_noun(s):
+    return {
+        "nom": [s + "a", s + "y"], "acc": [s + "ų", s + "y"], "gen": [s + "y", s],
+        "loc": [s + "ě", s + "ah"], "dat": [s + "ě", s + "am"],
+        "ins": [s + "ojų", s + "ami"], "voc": [s + "o", s + "y"],
+    }
+
+
+def neuter_noun(s):
+    return {
+        "nom": [s + "o", s + "a"], "acc": [s + "o", s + "a"], "gen": [s + "a", s],
+        "loc": [s + "u", s + "ah"], "dat": [s + "u", s + "am"],
+        "ins": [s + "om", s + "ami"], "voc": [s + "o", s + "a"],
+    }
+
+
+def verb(s, reflexive=False):
+    refl = " sę" if reflexive else ""
+    return {
+        "infinitive": s + "ati" + refl,
+        "present": [s + "ajų" + refl, s + "aješ" + refl, s + "aje" + refl,
+                    s + "ajemo" + refl, s + "ajete" + refl, s + "ajųt" + refl],
+        "imperfect": [s + "ah", s + "aše", s + "aše", s + "ahmo", s + "aste", s + "ahų"],
+        "future": [aux + " " + s + "ati" for aux in
+                   ["bųdų", "bųdeš", "bųde", "bųdemo", "bųdete", "bųdųt"]],
+        "perfect": ["jesm " + s + "al(a)", "jesi " + s + "al(a)", "(je) " + s + "al",
+                    "(je) " + s + "ala", "(je) " + s + "alo", "jesmo " + s + "ali",
+                    "jeste " + s + "ali", "(sųt) " + s + "ali"],
+        "pluperfect": ["běh " + s + "al(a)", "běše " + s + "al(a)", "běše " + s + "al",
+                       "běše " + s + "ala", "běše " + s + "alo", "běhmo " + s + "ali",
+                       "běste " + s + "ali", "běhų " + s + "ali"],
+        "conditional": ["byh " + s + "al(a)", "byš " + s + "al(a)", "by " + s + "al",
+                        "by " + s + "ala", "by " + s + "alo", "byhmo " + s + "ali",
+                        "byste " + s + "ali", "by " + s + "ali"],
+        "imperative": s + "aj, " + s + "ajmo, " + s + "ajte",
+        "prap": s + "ajųći (-a, -e)",
+        "prpp": s + "ajemy (-a, -o)",
+        "pfap": s + "avši (-a, -e)",
+        "pfpp": s + "any (-a, -o)",
+        "gerund": s + "ańje",
+    }
+
+
+def make_entry(rng, pos, stem):
+    """
+    Returns (lemma, pos, list of paradigms) for one dictionary entry
+    """
+    if pos == "m.":
+        return stem, pos, [masculine_noun(stem)]
+    if pos == "f.":
+        return stem + "a", pos, [feminine_noun(stem)]
+    if pos == "n.":
+        return stem + "o", pos, [neuter_noun(stem)]
+    if pos == "m./f.":
+        return stem + "a", pos, [feminine_noun(stem), feminine_noun(stem)]
+    if pos == "adj.":
+        return stem + "y", pos, [adjective(stem)]
+    if pos.startswith("v. refl."):
+        return stem + "ati sę", pos, [verb(stem, reflexive=True)]
+    if pos.startswith("v."):
+        return stem + "ati", pos, [verb(stem)]
+    if pos == "pron.dem.":
+        return stem + "y", pos, [dict(adjective(stem), type="adjective")]
+    if pos == "phrase":
+        return stem + "o " + make_stem(rng, 2) + "a", pos, [""]
+    if pos == "multiword":
+        other = make_stem(rng, 2)
+        return other + "y " + stem, "m.", [{
+            case: [other + "y " + sing, other + "e " + plur]
+            for case, (sing, plur) in masculine_noun(stem).items()}]
+    # indeclinable
+    word = stem + rng.choice(["o", "e", "i", ""])
+    return word, pos, [word]
+
+
+def iterate_entries(n_lemmas, seed=0):
+    """
+    Yields (word_id, lemma, pos, paradigms) for n_lemmas distinct lemmas
+    """
+    rng = random.Random(seed)
+    tags = [pos for pos, _ in POS_MIX]
+    weights = [weight for _, weight in POS_MIX]
+    seen = set()
+    word_id = 0
+    while word_id < n_lemmas:
+        pos = rng.choices(tags, weights)[0]
+        stem = make_stem(rng, rng.choice([1, 2, 2, 2, 3, 3, 4]))
+        lemma, entry_pos, paradigms = make_entry(rng, pos, stem)
+        if lemma in seen:
+            continue
+        seen.add(lemma)
+        word_id += 1
+        yield word_id, lemma, entry_pos, paradigms
+
+
+def write_words_forms(fname, n_lemmas, seed=0):
+    """
+    Writes words_forms.txt in the layout Dictionary reads:
+    header line, then raw_json \\t forms_json \\t pos per entry.
+    Compressed if fname ends with .gz/.bz2/.zst
+    """
+    with open_output(fname) as fp:
+        fp.write(b"id\tforms\tpos\n")
+        for word_id, lemma, pos, paradigms in iterate_entries(n_lemmas, seed):
+            line = "\t".join([
+                ujson.dumps([str(word_id), lemma, "", pos],
+                            ensure_ascii=False, escape_forward_slashes=False),
+                ujson.dumps(paradigms,
+                            ensure_ascii=False, escape_forward_slashes=False),
+                pos,
+            ])
+            fp.write((line + "\n").encode("utf8"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic words_forms.txt')
+    parser.add_argument('out')
+    parser.add_argument('--lemmas', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_words_forms(args.out, args.lemmas, seed=args.seed)
@@ -0,0 +1,35 @@
+from tokenizer import WORD, NUMBER, PUNCT, tokenize, tokenize_many, words
+# the benchmark's oracle, so both check against the same reference
+from bench_tokenizer import reference_tokenize, fuzz_texts
+from bench_toolchain import DEFAULT_CORPUS, read_corpus
+
+
+def assert_same_as_reference(texts):
+    for text in texts:
+        expected = reference_tokenize(text)
+        found = tokenize(text)
+        assert [(start, end, kind == WORD) for start, end, kind in found] == expected, text
+        assert words(text) == [text[start:end] for start, end, is_word in expected if is_word]
+
+
+def test_corpus_matches_reference():
+    paragraphs = read_corpus(DEFAULT_CORPUS)
+    assert paragraphs
+    assert_same_as_reference(paragraphs)
+
+
+def test_fuzz_matches_reference():
+    assert_same_as_reference(fuzz_texts(20000))
+
+
+def test_tokenize_many_matches_tokenize():
+    texts = read_corpus(DEFAULT_CORPUS) + fuzz_texts(2000, seed=1) + ["", "\n", " a "]
+    assert tokenize_many(texts) == [tokenize(text) for text in texts]
+
+
+def test_kinds():
+    text = "Ja mam 2 brata, i sestru."
+    assert [(text[start:end], kind) for start, end, kind in tokenize(text)] == [
+        ("Ja", WORD), ("mam", WORD), ("2", NUMBER), ("brata", WORD), (",", PUNCT),
+        ("i", WORD), ("sestru", WORD), (".", PUNCT),
+    ]
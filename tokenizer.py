@@ -0,0 +1,91 @@
+import re
+from bisect import bisect_right
+from itertools import accumulate, repeat
+from operator import sub
+
+from constants import BASE_ISV_TOKEN_REGEX
+
+WORD = "word"
+NUMBER = "number"
+PUNCT = "punct"
+
+# BASE_ISV_TOKEN_REGEX with the whole token as the only group, so that
+# split() returns [gap, token, gap, token, ..., gap] in one C-level call
+TOKEN_SPLIT_REGEX = re.compile(
+    "(" + BASE_ISV_TOKEN_REGEX.pattern.replace("(-?", "(?:-?") + ")",
+    BASE_ISV_TOKEN_REGEX.flags
+)
+
+# distinct tokens are few compared to their occurrences, so the kind is
+# computed once per token and then only looked up
+KIND_CACHE_SIZE = 200000
+
+
+class _TokenKinds(dict):
+    def __missing__(self, token):
+        if len(self) >= KIND_CACHE_SIZE:
+            self.clear()
+        if any(c.isalpha() for c in token):
+            kind = WORD
+        elif any(c.isdigit() for c in token):
+            kind = NUMBER
+        else:
+            kind = PUNCT
+        self[token] = kind
+        return kind
+
+
+_kinds = _TokenKinds()
+
+
+def _spans(parts):
+    # parts alternate gap, token, gap, ...; running sum of their lengths
+    # gives token starts (even positions) and ends (odd positions)
+    bounds = list(accumulate(map(len, parts)))
+    return bounds[0::2], bounds[1::2]
+
+
+def tokenize(text):
+    """
+    Returns list of (start, end, kind) for every token of text, with the
+    same boundaries as BASE_ISV_TOKEN_REGEX.finditer. Kind is WORD if the
+    token has a letter, NUMBER if it has a digit, PUNCT otherwise.
+    """
+    parts = TOKEN_SPLIT_REGEX.split(text)
+    starts, ends = _spans(parts)
+    return list(zip(starts, ends, map(_kinds.__getitem__, parts[1::2])))
+
+
+def tokenize_many(paragraphs):
+    """
+    Batch version of tokenize: list of token lists, one per paragraph.
+    Paragraphs are joined with "\\n" (tokens never contain whitespace)
+    and split in one pass.
+    """
+    parts = TOKEN_SPLIT_REGEX.split("\n".join(paragraphs))
+    starts, ends = _spans(parts)
+    kinds = list(map(_kinds.__getitem__, parts[1::2]))
+
+    result = []
+    first = 0
+    offset = 0
+    for paragraph in paragraphs:
+        # tokens of this paragraph are the ones that end inside it
+        limit = offset + len(paragraph)
+        last = bisect_right(ends, limit, first)
+        result.append(list(zip(
+            map(sub, starts[first:last], repeat(offset)),
+            map(sub, ends[first:last], repeat(offset)),
+            kinds[first:last])))
+        first = last
+        offset = limit + 1
+    return result
+
+
+def words(text):
+    """
+    Word tokens of text (what example4.iterate_over_text yields)
+    """
+    parts = TOKEN_SPLIT_REGEX.split(text)[1::2]
+    return [token for token, kind in zip(parts, map(_kinds.__getitem__, parts))
+            if kind == WORD]
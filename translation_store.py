@@ -0,0 +1,361 @@
+import re
+import sqlite3
+import argparse
+import unicodedata
+from collections import defaultdict
+
+from compressed_io import open_compressed
+
+# columns of the first section of data.txt
+METADATA_COLUMNS = [
+    "word_id", "ISV", "addition", "PartOfSpeech",
+    "EN", "RU", "BE", "UK", "PL", "CS", "SK", "SL", "HR", "SR", "MK", "BG"
+]
+SECTION_SEPARATOR = "<>"
+
+METADATA = "metadata"
+TRANSLATION = "translation"
+UNKNOWN = "unknown"
+
+SCHEMA = """
+CREATE TABLE words (
+    word_id TEXT PRIMARY KEY, isv TEXT, addition TEXT, pos TEXT,
+    en TEXT, ru TEXT, be TEXT, uk TEXT, pl TEXT, cs TEXT, sk TEXT,
+    sl TEXT, hr TEXT, sr TEXT, mk TEXT, bg TEXT
+);
+CREATE TABLE translations (
+    word_id TEXT, lang TEXT, position INTEGER, value TEXT
+);
+CREATE TABLE synonyms (word_id TEXT, lang TEXT, value TEXT, key TEXT);
+CREATE TABLE unknown_ids (entry TEXT);
+CREATE TABLE reverse (lang TEXT, word TEXT, word_id TEXT, exact INTEGER);
+"""
+
+# created after the data is in, that is much faster than keeping them
+# up to date on every insert
+INDEXES = """
+CREATE INDEX translations_word_id ON translations (word_id, lang, position);
+CREATE INDEX synonyms_key ON synonyms (lang, key, word_id);
+CREATE INDEX reverse_word ON reverse (lang, word, exact, word_id);
+"""
+
+# full text search over the values, only if sqlite has fts5
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE translations_fts USING fts5(
+    value, content='translations', tokenize='unicode61 remove_diacritics 2'
+);
+INSERT INTO translations_fts(translations_fts) VALUES ('rebuild');
+"""
+
+# stress marks of ru/uk/be/bg/sr/mk dictionary entries
+STRESS_MARKS = str.maketrans("", "", "\u0300\u0301")
+
+# words of translation values: letters, with hyphen or apostrophe inside
+# (the ISV tokenizer only knows ISV letters, łódź or ґанок would split)
+WORD_REGEX = re.compile(r"[^\W\d_]+(?:['’-][^\W\d_]+)*")
+
+# sqlite has a limit on the number of parameters of one query
+MAX_PARAMS = 500
+
+# larger than any character, for prefix ranges on the key index
+MAX_CHAR = "\U0010ffff"
+
+
+def normalize(value):
+    """
+    lowercase, without stress marks and ё
+    """
+    # after NFC only marks without a precomposed letter (stress on
+    # cyrillic vowels) stay separate, so ś, á or ѓ are kept
+    value = unicodedata.normalize("NFC", value.strip().lower())
+    return value.translate(STRESS_MARKS).replace("ё", "е")
+
+
+def split_words(value):
+    """
+    normalized words of a translation value or a sentence
+    """
+    return WORD_REGEX.findall(normalize(value))
+
+
+def split_synonyms(value):
+    """
+    "dom, budynek (mały, drewniany)" -> ["dom", "budynek (mały, drewniany)"]:
+    a translation cell often lists several synonyms, commas inside
+    brackets do not separate them
+    """
+    synonyms = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(value):
+        if c in "([":
+            depth += 1
+        elif c in ")]":
+            depth = max(depth - 1, 0)
+        elif c == "," and not depth:
+            synonyms.append(value[start:i])
+            start = i + 1
+    synonyms.append(value[start:])
+    return [synonym.strip() for synonym in synonyms if synonym.strip()]
+
+
+def iterate_synonym_rows(word_id, lang, values):
+    seen = set()
+    for value in values:
+        for synonym in split_synonyms(value):
+            key = normalize(synonym)
+            if key not in seen:
+                seen.add(key)
+                yield word_id, lang, synonym, key
+
+
+def iterate_reverse_rows(word_id, lang, values):
+    seen = set()
+    for value in values:
+        found = split_words(value)
+        exact = int(len(found) == 1)
+        for word in found:
+            if (word, exact) not in seen:
+                seen.add((word, exact))
+                yield lang, word, word_id, exact
+
+
+def _parse_line(section, line):
+    arr = line.strip().split('\t')
+    if section == 0:
+        if arr[0] == METADATA_COLUMNS[0]:
+            # column names
+            return
+        if len(arr) == len(METADATA_COLUMNS):
+            yield METADATA, tuple(arr)
+        if len(arr) == 1 and arr[0]:
+            yield UNKNOWN, arr[0]
+    elif section == 1:
+        if arr[0].startswith("id"):
+            return
+        if len(arr) == 1 and arr[0]:
+            yield UNKNOWN, arr[0]
+        if len(arr) == 2:
+            lang_id, value = arr
+            word_id, _, lang = lang_id.partition("-")
+            yield TRANSLATION, (word_id, lang, value.split("|"))
+
+
+def iterate_data(fname):
+    """
+    Streams data.txt (metadata <> translations <> completion stats)
+    without reading it whole. Yields (METADATA, 16 column tuple),
+    (TRANSLATION, (word_id, lang, values)) and (UNKNOWN, entry)
+    """
+    section = 0
+    with open_compressed(fname, "rt") as f:
+        for line in f:
+            for n, piece in enumerate(line.split(SECTION_SEPARATOR)):
+                if n:
+                    section += 1
+                for subline in piece.splitlines():
+                    yield from _parse_line(section, subline)
+
+
+def read_data(fname):
+    """
+    metadata rows, translations[word_id][lang] -> values and unknown ids,
+    what slovnik_parser used to build from data.txt
+    """
+    metadata_arr = []
+    translations = defaultdict(dict)
+    unknown_ids = []
+    for kind, entry in iterate_data(fname):
+        if kind == METADATA:
+            metadata_arr.append(entry)
+        elif kind == TRANSLATION:
+            word_id, lang, values = entry
+            translations[word_id][lang] = values
+        else:
+            unknown_ids.append(entry)
+    return metadata_arr, translations, unknown_ids
+
+
+def build_store(data_fname, db_fname):
+    """
+    Writes data.txt into an sqlite database for TranslationStore
+    """
+    conn = sqlite3.connect(db_fname)
+    conn.executescript(
+        "DROP TABLE IF EXISTS words; DROP TABLE IF EXISTS translations;"
+        "DROP TABLE IF EXISTS unknown_ids; DROP TABLE IF EXISTS translations_fts;"
+        "DROP TABLE IF EXISTS reverse; DROP TABLE IF EXISTS synonyms;"
+    )
+    conn.executescript(SCHEMA)
+
+    n_words = 0
+    n_values = 0
+    with conn:
+        for kind, entry in iterate_data(data_fname):
+            if kind == METADATA:
+                conn.execute(
+                    "INSERT OR REPLACE INTO words VALUES (%s)"
+                    % ", ".join("?" * len(METADATA_COLUMNS)), entry)
+                n_words += 1
+            elif kind == TRANSLATION:
+                word_id, lang, values = entry
+                conn.executemany(
+                    "INSERT INTO translations VALUES (?, ?, ?, ?)",
+                    [(word_id, lang, i, value) for i, value in enumerate(values)])
+                conn.executemany(
+                    "INSERT INTO synonyms VALUES (?, ?, ?, ?)",
+                    iterate_synonym_rows(word_id, lang, values))
+                conn.executemany(
+                    "INSERT INTO reverse VALUES (?, ?, ?, ?)",
+                    iterate_reverse_rows(word_id, lang, values))
+                n_values += len(values)
+            else:
+                conn.execute("INSERT INTO unknown_ids VALUES (?)", (entry,))
+        conn.executescript(INDEXES)
+        try:
+            conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            # built without fts5, search() is not available then
+            pass
+    conn.execute("ANALYZE")
+    conn.close()
+    return n_words, n_values
+
+
+class TranslationStore(object):
+    """
+    Read-only lookups in the database written by build_store.
+    Languages are the suffixes of data.txt translation ids
+    ("isv", "isv-src", "en", "ru", ...), matching is case-insensitive.
+    """
+    def __init__(self, fname):
+        self.fname = fname
+        self.conn = sqlite3.connect(
+            "file:%s?mode=ro" % fname, uri=True, check_same_thread=False)
+        self.has_fts = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'translations_fts'"
+        ).fetchone() is not None
+
+    def close(self):
+        self.conn.close()
+
+    def languages(self):
+        return [lang for lang, in self.conn.execute(
+            "SELECT DISTINCT lang FROM translations ORDER BY lang")]
+
+    def by_id(self, word_id):
+        """
+        Returns metadata columns plus "translations": {lang: values}
+        for word_id, None if there is no such word
+        """
+        row = self.conn.execute(
+            "SELECT * FROM words WHERE word_id = ?", (word_id,)).fetchone()
+        translations = defaultdict(list)
+        for lang, value in self.conn.execute(
+                "SELECT lang, value FROM translations WHERE word_id = ? "
+                "ORDER BY lang, position", (word_id,)):
+            translations[lang].append(value)
+        if row is None and not translations:
+            return None
+        entry = dict(zip(METADATA_COLUMNS, row or [word_id]))
+        entry["translations"] = dict(translations)
+        return entry
+
+    def lookup(self, lang, word):
+        """
+        word_ids which have word (or phrase) as one of the synonyms of
+        their lang translations; for single words inside longer phrases
+        see reverse_lookup
+        """
+        return [word_id for word_id, in self.conn.execute(
+            "SELECT word_id FROM synonyms WHERE lang = ? AND key = ? "
+            "GROUP BY word_id ORDER BY MIN(rowid)", (lang.lower(), normalize(word)))]
+
+    def by_isv(self, lemma):
+        return [self.by_id(word_id) for word_id in self.lookup("isv", lemma)]
+
+    def lookup_prefix(self, lang, prefix, limit=20):
+        """
+        [(synonym, word_id), ...] of lang translations starting with prefix
+        """
+        key = normalize(prefix)
+        return self.conn.execute(
+            "SELECT value, word_id FROM synonyms "
+            "WHERE lang = ? AND key >= ? AND key < ? ORDER BY key LIMIT ?",
+            (lang.lower(), key, key + MAX_CHAR, limit)).fetchall()
+
+    def reverse_lookup(self, lang, word):
+        """
+        word_ids of ISV words that have word in a lang translation;
+        one-word translations go first, then the ones in phrases
+        """
+        return self.reverse_lookup_many(lang, [word])[0]
+
+    def reverse_lookup_many(self, lang, words):
+        """
+        Batch version of reverse_lookup for a whole tokenized sentence:
+        list of word_id lists, one per word, in one query per
+        MAX_PARAMS distinct words
+        """
+        normalized = [normalize(word) for word in words]
+        distinct = list(dict.fromkeys(normalized))
+        found = {word: [] for word in distinct}
+        for i in range(0, len(distinct), MAX_PARAMS):
+            chunk = distinct[i:i + MAX_PARAMS]
+            rows = self.conn.execute(
+                "SELECT word, word_id FROM reverse WHERE lang = ? AND word IN (%s) "
+                "ORDER BY exact DESC, rowid" % ", ".join("?" * len(chunk)),
+                [lang.lower()] + chunk)
+            for word, word_id in rows:
+                if word_id not in found[word]:
+                    found[word].append(word_id)
+        return [found[word] for word in normalized]
+
+    def reverse_lookup_text(self, lang, text):
+        """
+        [(word, word_ids), ...] for every word of a lang sentence
+        """
+        words = WORD_REGEX.findall(normalize(text))
+        return list(zip(words, self.reverse_lookup_many(lang, words)))
+
+    def isv_lemmas(self, word_ids):
+        """
+        {word_id: ISV lemma} for the metadata of word_ids
+        """
+        distinct = list(dict.fromkeys(word_ids))
+        result = {}
+        for i in range(0, len(distinct), MAX_PARAMS):
+            chunk = distinct[i:i + MAX_PARAMS]
+            result.update(self.conn.execute(
+                "SELECT word_id, isv FROM words WHERE word_id IN (%s)"
+                % ", ".join("?" * len(chunk)), chunk))
+        return result
+
+    def search(self, query, lang=None, limit=20):
+        """
+        Full text search: [(lang, value, word_id), ...] of translations
+        containing the words of query, diacritics ignored
+        """
+        if not self.has_fts:
+            raise RuntimeError("%s was built without fts5" % self.fname)
+        sql = ("SELECT t.lang, t.value, t.word_id FROM translations_fts f "
+               "JOIN translations t ON t.rowid = f.rowid "
+               "WHERE translations_fts MATCH ?")
+        params = [" ".join('"%s"' % word.replace('"', '""') for word in query.split())]
+        if lang is not None:
+            sql += " AND t.lang = ?"
+            params.append(lang.lower())
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return self.conn.execute(sql, params).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Build sqlite translation store from data.txt')
+    parser.add_argument('data', help='data.txt (may be compressed)')
+    parser.add_argument('out')
+    args = parser.parse_args()
+
+    n_words, n_values = build_store(args.data, args.out)
+    print(f"{n_words} words, {n_values} translations -> {args.out}")
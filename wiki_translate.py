@@ -1,9 +1,178 @@
-import wikipediaapi
+import json
+import sqlite3
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import wikipediaapi
+except ImportError:
+    wikipediaapi = None
 
 SLOVJANSKE_VIKI = set("en ru pl uk sr cs sh bg sk hr be sl mk be-tarask hsb rue dsb cu".split(" "))
 
 
+class WikipediaApiBackend(object):
+    """
+    Pages from the live wikipedia through wikipediaapi,
+    one client per thread and language
+    """
+    def __init__(self):
+        if wikipediaapi is None:
+            raise ImportError("wikipediaapi package is required for live pages")
+        self._local = threading.local()
+
+    def _wiki(self, lang):
+        wikis = self._local.__dict__.setdefault("wikis", {})
+        if lang not in wikis:
+            wikis[lang] = wikipediaapi.Wikipedia(lang)
+        return wikis[lang]
+
+    def langlinks(self, lang, title):
+        page = self._wiki(lang).page(title)
+        if not page.exists():
+            return {}
+        return {k: v.title for k, v in page.langlinks.items()}
+
+    def summary(self, lang, title):
+        return self._wiki(lang).page(title).summary
+
+
+class JsonBackend(object):
+    """
+    Pages from a JSON file {lang: {title: {"langlinks": {lang: title},
+    "summary": text}}}, e.g. a fixture for tests or an extract of a dump
+    """
+    def __init__(self, fname):
+        with open(fname, "r", encoding="utf8") as f:
+            self.pages = json.load(f)
+
+    def _page(self, lang, title):
+        return self.pages.get(lang, {}).get(title, {})
+
+    def langlinks(self, lang, title):
+        return dict(self._page(lang, title).get("langlinks", {}))
+
+    def summary(self, lang, title):
+        return self._page(lang, title).get("summary", "")
+
+
+def make_backend(spec):
+    """
+    "wikipediaapi" or "json:<fname>"
+    """
+    name, _, arg = spec.partition(":")
+    if name == "wikipediaapi":
+        return WikipediaApiBackend()
+    if name == "json":
+        return JsonBackend(arg)
+    raise ValueError("unknown backend %s" % spec)
+
+
+class PageCache(object):
+    """
+    Langlinks and summaries keyed by (lang, title) in an sqlite file,
+    so a title is fetched only once across runs
+    """
+    def __init__(self, fname):
+        self.conn = sqlite3.connect(fname, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages (lang TEXT, title TEXT, "
+                "langlinks TEXT, summary TEXT, PRIMARY KEY (lang, title))")
+
+    def close(self):
+        self.conn.close()
+
+    def _get(self, column, lang, title):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT %s FROM pages WHERE lang = ? AND title = ?" % column,
+                (lang, title)).fetchone()
+        return None if row is None else row[0]
+
+    def _set(self, column, lang, title, value):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO pages (lang, title, %s) VALUES (?, ?, ?) "
+                "ON CONFLICT (lang, title) DO UPDATE SET %s = excluded.%s"
+                % (column, column, column), (lang, title, value))
+
+    def get_langlinks(self, lang, title):
+        found = self._get("langlinks", lang, title)
+        return None if found is None else json.loads(found)
+
+    def set_langlinks(self, lang, title, langlinks):
+        self._set("langlinks", lang, title, json.dumps(langlinks, ensure_ascii=False))
+
+    def get_summary(self, lang, title):
+        return self._get("summary", lang, title)
+
+    def set_summary(self, lang, title, summary):
+        self._set("summary", lang, title, summary)
+
+
+class LanglinkFetcher(object):
+    """
+    Resolves langlinks of many titles with at most `workers` requests
+    at once. Failed pages are collected in errors and not cached.
+    """
+    def __init__(self, backend, cache=None, workers=8):
+        self.backend = backend
+        self.cache = cache
+        self.workers = workers
+        self.errors = []
+
+    def langlinks(self, lang, title):
+        if self.cache is not None:
+            found = self.cache.get_langlinks(lang, title)
+            if found is not None:
+                return found
+        try:
+            found = self.backend.langlinks(lang, title)
+        except Exception as e:
+            self.errors.append((lang, title, str(e)))
+            return {}
+        if self.cache is not None:
+            self.cache.set_langlinks(lang, title, found)
+        return found
+
+    def summary(self, lang, title):
+        if self.cache is not None:
+            found = self.cache.get_summary(lang, title)
+            if found is not None:
+                return found
+        try:
+            found = self.backend.summary(lang, title)
+        except Exception as e:
+            self.errors.append((lang, title, str(e)))
+            return None
+        if self.cache is not None:
+            self.cache.set_summary(lang, title, found)
+        return found
+
+    def translate_many(self, titles, lang="en", summaries=False):
+        """
+        Returns {title: {lang: local title}} for SLOVJANSKE_VIKI, and
+        with summaries also {(lang, local title): summary}
+        """
+        titles = list(dict.fromkeys(title.strip() for title in titles if title.strip()))
+        with ThreadPoolExecutor(self.workers) as pool:
+            found = pool.map(lambda title: self.langlinks(lang, title), titles)
+            result = {
+                title: {k: v for k, v in sorted(langlinks.items()) if k in SLOVJANSKE_VIKI}
+                for title, langlinks in zip(titles, found)
+            }
+            texts = {}
+            if summaries:
+                pages = [(lang, title) for title in titles]
+                pages += [page for links in result.values() for page in links.items()]
+                pages = list(dict.fromkeys(pages))
+                texts = dict(zip(pages, pool.map(lambda page: self.summary(*page), pages)))
+        return result, texts
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='Kludge Translate.')
@@ -14,25 +183,50 @@ if __name__ == '__main__':
         '--lang', help='the source lang', default='en',
     )
     parser.add_argument(
-        'stranica', help='stranica za poczatok'
+        'stranica', help='stranica za poczatok', nargs='?', default=None
     )
+    parser.add_argument(
+        '--titles', default=None,
+        help='batch mode: file with one title per line instead of stranica')
+    parser.add_argument(
+        '--backend', default='wikipediaapi',
+        help='wikipediaapi or json:<file> with pages for tests/dumps')
+    parser.add_argument(
+        '--cache', default=None, help='sqlite file for fetched pages')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument(
+        '--out', default=None, help='batch mode: write langlinks as JSON')
 
     args = parser.parse_args()
+    if args.stranica is None and args.titles is None:
+        parser.error("stranica or --titles is required")
 
-    wiki_wiki = wikipediaapi.Wikipedia(args.lang)
-    page_test = wiki_wiki.page(args.stranica.strip())
-    print(page_test)
+    cache = PageCache(args.cache) if args.cache else None
+    fetcher = LanglinkFetcher(make_backend(args.backend), cache, args.workers)
 
-    if args.priegled:
-        print(page_test.summary)
+    if args.titles is not None:
+        with open(args.titles, "r", encoding="utf8") as f:
+            titles = f.read().splitlines()
+    else:
+        titles = [args.stranica]
 
-    langlinks = page_test.langlinks
+    langlinks, summaries = fetcher.translate_many(
+        titles, lang=args.lang, summaries=args.priegled)
 
-    print(f"`{args.lang}` {args.stranica}")
-    for k in set(langlinks.keys()) & SLOVJANSKE_VIKI:
-        v = langlinks[k]
-        print(f"`{k}` {v.title}")
+    for title, links in langlinks.items():
+        print(f"`{args.lang}` {title}")
         if args.priegled:
-            local_page = page_test.langlinks[k]
-            print(local_page.summary)
-            print("----------")
+            print(summaries[(args.lang, title)])
+        for k, v in links.items():
+            print(f"`{k}` {v}")
+            if args.priegled:
+                print(summaries[(k, v)])
+                print("----------")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf8") as f:
+            json.dump(langlinks, f, ensure_ascii=False, indent=2)
+    for lang, title, message in fetcher.errors:
+        print(f"ERROR `{lang}` {title}: {message}")
+    if cache is not None:
+        cache.close()
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import argparse
+
+# fields of /proc/<pid>/smaps_rollup, in kB
+FIELDS = ["Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"]
+
+
+def read_memory(pid):
+    """
+    {"rss", "pss", "shared", "private"} of a process in kB (Linux only)
+    """
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in FIELDS:
+                values[name] = int(rest.split()[0])
+    return {
+        "rss": values["Rss"],
+        "pss": values["Pss"],
+        "shared": values["Shared_Clean"] + values["Shared_Dirty"],
+        "private": values["Private_Clean"] + values["Private_Dirty"],
+    }
+
+
+def children(pid):
+    found = []
+    task_dir = f"/proc/{pid}/task"
+    for tid in os.listdir(task_dir):
+        with open(f"{task_dir}/{tid}/children", "r") as f:
+            found.extend(int(child) for child in f.read().split())
+    return found
+
+
+def report(master_pid, out=sys.stdout):
+    """
+    Prints memory of the master and each of its worker processes.
+    Private is what a worker really costs; shared are the pages it still
+    shares with the master (dictionaries loaded before fork).
+    """
+    print(f"{'pid':>8} {'rss MB':>9} {'pss MB':>9} {'shared MB':>10} {'private MB':>11}",
+          file=out)
+    for n, pid in enumerate([master_pid] + children(master_pid)):
+        try:
+            memory = read_memory(pid)
+        except FileNotFoundError:
+            continue
+        name = "master" if n == 0 else "worker"
+        print(f"{pid:>8} {memory['rss'] / 1024:9.1f} {memory['pss'] / 1024:9.1f} "
+              f"{memory['shared'] / 1024:10.1f} {memory['private'] / 1024:11.1f}  {name}",
+              file=out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Shared and private memory of a server and its workers')
+    parser.add_argument('pid', type=int, help='pid of the master process')
+    parser.add_argument(
+        '--every', type=float, default=None,
+        help='repeat every this many seconds')
+    args = parser.parse_args()
+
+    while True:
+        report(args.pid)
+        if args.every is None:
+            break
+        time.sleep(args.every)
+        print()